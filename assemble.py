@@ -1,34 +1,215 @@
+import io
 import os
 import argparse
 import sys
 import re
+import time
+import glob
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import chain
+
+import isa
+from preprocess import Preprocessor
+from stats import Stats, timed
+
+class Image(bytearray):
+    # An assembled program: its words packed in .bin (big-endian) byte order plus the address of
+    # the first word. Being a bytearray it exposes the buffer protocol, so memoryview(image) or
+    # f.write(image) hands the raw words to a simulator or a file without copying.
+    def __init__(self, start_address=0, words=()):
+        packed = array("I", words)
+        if sys.byteorder == "little":
+            packed.byteswap()
+        super().__init__(packed)
+        self.start_address = start_address
+
+    def words(self):
+        words = array("I")
+        words.frombytes(self)
+        if sys.byteorder == "little":
+            words.byteswap()
+        return words
+
+    def entries(self):
+        return zip(range(self.start_address, self.start_address + len(self), 4), self.words())
+
+    def render_bin(self):
+        return self
+
+    def render_hex(self):
+        return self.hex("\n", 4).upper() + "\n" if self else ""
+
+    def render_bintxt(self):
+        # The whole image is formatted as one binary number, then every 32 digits are moved one
+        # place further per line to leave room for the line breaks
+        count = len(self) // 4
+        if not count:
+            return ""
+        digits = format(int.from_bytes(self, "big"), f"0{count * 32}b").encode()
+        text = bytearray(count * 33)
+        for column in range(32):
+            text[column::33] = digits[column::32]
+        text[32::33] = b"\n" * count
+        return text.decode()
+
+    def render_hextxt(self):
+        # "AA BB CC DD " per word, then every fourth separator becomes the line break
+        text = bytearray(self.hex(" ").upper().encode() + b" ") if self else bytearray()
+        text[11::12] = b"\n" * (len(self) // 4)
+        return text.decode()
+
+    # Sparse formats: only the segment's own bytes are written, at their addresses
+    def render_seg(self):
+        return self.start_address.to_bytes(4, "big") + len(self).to_bytes(4, "big") + self
+
+    def render_ihex(self):
+        # Type 04 records set the upper address half whenever it changes; data records end on
+        # 16-byte boundaries so none crosses into the next 64 KiB
+        records = []
+        upper = None
+        address, end = self.start_address, self.start_address + len(self)
+        while address < end:
+            if address >> 16 != upper:
+                upper = address >> 16
+                records.append(ihex_record(4, 0, upper.to_bytes(2, "big")))
+            size = min(16 - (address & 15), end - address)
+            offset = address - self.start_address
+            records.append(ihex_record(0, address & 0xFFFF, self[offset:offset + size]))
+            address += size
+        return "".join(records)
+
+    def render_srec(self):
+        return "".join(srec_record(3, self.start_address + offset, self[offset:offset + 16]) for offset in range(0, len(self), 16))
+
+
+def ihex_record(kind, address, data):
+    record = bytes((len(data), address >> 8, address & 0xFF, kind)) + data
+    return f":{record.hex().upper()}{-sum(record) & 0xFF:02X}\n"
+
+
+def srec_record(kind, address, data, address_size=4):
+    record = bytes((address_size + len(data) + 1,)) + address.to_bytes(address_size, "big") + data
+    return f"S{kind}{record.hex().upper()}{~sum(record) & 0xFF:02X}\n"
+
+
+def framing(fmt, entry):
+    # (header, footer) of an output file; the sparse formats end with the entry point
+    if fmt == "seg":
+        return SegmentMap.magic, entry.to_bytes(4, "big") + bytes(4)
+    if fmt == "ihex":
+        return "", ihex_record(5, 0, entry.to_bytes(4, "big")) + ihex_record(1, 0, b"")
+    if fmt == "srec":
+        return srec_record(0, 0, b"", 2), srec_record(7, entry, b"")
+    return (b"", b"") if fmt == "bin" else ("", "")
+
+
+class SegmentMap(list):
+    # A sparse program: non-overlapping Image segments sorted by address, plus its entry point.
+    # The sparse formats hold only the segments' bytes; the flat ones (bin, hex, bintxt, hextxt)
+    # are a plain memory image, so the gaps between segments become zero words there.
+    # A .seg container is the magic, then per segment its address, byte length and words
+    # (big-endian), then the entry point followed by a zero length.
+    magic = b"SRSG"
+    sparse_formats = {"seg", "ihex", "srec"}
+
+    def __init__(self, segments=(), entry=None):
+        super().__init__(sorted(segments, key=lambda segment: segment.start_address))
+        self.entry = entry if entry is not None else self[0].start_address if self else 0
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        if data[:4] != cls.magic:
+            raise ValueError("Not a segment container")
+        segments = []
+        offset = 4
+        while offset + 8 <= len(data):
+            address = int.from_bytes(data[offset:offset + 4], "big")
+            size = int.from_bytes(data[offset + 4:offset + 8], "big")
+            offset += 8
+            if not size:
+                return cls(segments, address)
+            if size % 4 or offset + size > len(data):
+                break
+            segment = Image(address)
+            segment.extend(data[offset:offset + size])
+            segments.append(segment)
+            offset += size
+        raise ValueError("Truncated segment container")
+
+    def entries(self):
+        return chain.from_iterable(segment.entries() for segment in self)
+
+    def flatten(self):
+        if len(self) == 1:
+            return self[0]
+        image = Image(self[0].start_address if self else 0)
+        for segment in self:
+            image.extend(bytes(segment.start_address - image.start_address - len(image)))
+            image.extend(segment)
+        return image
+
+    def render(self, fmt):
+        header, footer = framing(fmt, self.entry)
+        runs = self if fmt in self.sparse_formats else [self.flatten()]
+        return header + header[:0].join(getattr(run, "render_" + fmt)() for run in runs) + footer
+
 
 class Assembler:
-    opcodes = {
-        "add": "00000", "sub": "00001", "mul": "00010", "div": "00011", "mod": "00100", "cmp": "00101",
-        "and": "00110", "or": "00111", "not": "01000", "mov": "01001", "lsl": "01010", "lsr": "01011",
-        "asr": "01100", "nop": "01101", "ld": "01110", "st": "01111",
-        "beq": "10000", "bgt": "10001", "b": "10010", "call": "10011", "ret": "10100", "hlt": "11111"
-    }
-    
-    mod_opcodes = {"add", "sub", "mul", "div", "mod", "and", "or", "lsl", "lsr", "asr"}
+    # instruction set tables, see isa.py
+    opcode_values = isa.opcode_values
+    opcode_names = isa.opcode_names
+    mod_opcodes = isa.modifiable
+    # mnemonic as written -> (base mnemonic, modifier bits)
+    mnemonics = isa.mnemonics
+    operand_counts = isa.operand_counts
 
-    def __init__(self, filename):
+    directives = {".start", ".main", ".org"}
+
+    # Set for object files (see link.py): code ahead of the first .org gets no address, and
+    # branches leaving their section or to labels defined elsewhere become relocations
+    relocatable = False
+
+    # Cleared when the source comes from outside (see server.py): '.include' could read any file
+    allow_include = True
+
+    # head, three operands and leftover text of every line, comments dropped
+    line_pattern = re.compile(r"^[ \t]*([^\s;,]*)[ \t,]*([^\s;,]*)[ \t,]*([^\s;,]*)[ \t,]*([^\s;,]*)[ \t,]*([^;\n]*)[^\n]*$", re.M)
+
+    # ld/st operands: "r1, 24[r2]", "r1, 0x1000 [r2]" or "r1.24[r2]"
+    mem_pattern = re.compile(r"\s*(\w+)\s*[.,]?\s*(0x[0-9a-fA-F]+|0b[01]+|-?\d+)\s*\[\s*(\w+)\s*\]\s*$")
+
+    def __init__(self, filename, source=None, stats=None):
+        # source, when given, is the program text itself and filename only names it in messages;
+        # stats, a stats.Stats, collects per-phase timings and counters
         self.filename = filename
-        self.instructions = []
+        self.source = source
+        self.stats = stats
         self.labels = {}
         self.start_address = 0x0000
         self.tokenized_instructions = []
-        self.instruction_encoded = []
+        self.segments = SegmentMap()
+        self.layout = []
+        self.sections = []
+        self.label_sections = {}
+        self.relocations = []
+        self.includes = []
+        self.errors = []
+        self.lines_read = 0
+
+    @property
+    def instruction_encoded(self):
+        # The whole program as one flat Image; gaps between sections become zero words
+        return self.segments.flatten()
 
-    def int_27b_binary(self,value):
+    def int_27b_field(self,value):
         if not (-67108864 <= value <= 67108863):
             raise ValueError("Value out of range for 27-bit signed integer")
-        value = int(value/4)
-        binary_27bit = bin(value & 0x7FFFFFF)[2:].zfill(27)  
-        return binary_27bit
+        return (value >> 2) & 0x7FFFFFF
    
-    def int_to_bin(self,value, size, mode="s"):
+    def imm_field(self,value, size, mode="s"):
         if mode not in ("s", "u"):
             raise ValueError("Mode must be 's' for signed or 'u' for unsigned")
 
@@ -39,10 +220,9 @@ class Assembler:
             if not (-2**(size-1) <= value < 2**(size-1)):
                 raise ValueError(f"Signed {size}-bit overflow: {value}")
 
-        bin_value = bin(value & (2**size - 1))[2:].zfill(size)  
-        return bin_value
+        return value & ((1 << size) - 1)
       
-    def reg_to_bin(self,register):
+    def reg_field(self,register):
         if not register.startswith("r") or not register[1:].isdigit():
             raise ValueError("Invalid register format. Expected 'r0' to 'r15'.")
 
@@ -51,7 +231,7 @@ class Assembler:
         if not (0 <= reg_num <= 15):  
             raise ValueError(f"Register {register} out of range (must be r0 to r15).")
 
-        return format(reg_num, "04b")  
+        return reg_num
       
     def to_int(self,value):
         if isinstance(value, int):  
@@ -70,179 +250,715 @@ class Assembler:
     
         return None  
 
-    def parse_data(self):
-        try:
-            with open(self.filename, "r") as file:
-                address = self.start_address
-                for line in file:
-                    clean_line = re.sub(r";.*", "", line).strip()
-                    if not clean_line:
+    def lex(self, text, lineno=1):
+        # One regex pass over the whole text splits every line into its head, up to three
+        # operands and any leftover, with comments already dropped. Each line is then classified
+        # as an instruction (u/h modifier resolved), a label or an origin directive.
+        # Yields (lineno, kind, value, modifier); bad lines go to self.errors and are skipped.
+        mnemonics = self.mnemonics
+        operand_counts = self.operand_counts
+        errors = self.errors
+        for lineno, (head, op1, op2, op3, rest) in enumerate(self.line_pattern.findall(text), lineno):
+            if not head:
+                if op1 or rest.strip():
+                    errors.append((lineno, f"Unexpected ',' in '{(op1 + ' ' + rest).strip()}'"))
+                continue
+
+            entry = mnemonics.get(head)
+            if entry is not None:
+                mnemonic, modifier = entry
+                if mnemonic == "ld" or mnemonic == "st":
+                    operands = " ".join((op1, op2, op3, rest))
+                    match = self.mem_pattern.match(operands)
+                    if match is None:
+                        errors.append((lineno, f"'{head}' expects operands 'rd, imm[rs1]'"))
                         continue
-                    if clean_line.startswith(".") and clean_line.endswith(":"):
-                        label_parts = clean_line[:-1].split()
-                        label = label_parts[0]
-                        if label in {".start", ".main", ".org"} and len(label_parts) == 2 and label_parts[1].startswith("0x"):
-                            self.start_address = int(label_parts[1], 16)
+                    rd, imm, rs1 = match.groups()
+                    yield lineno, "instr", (mnemonic, rd, rs1, imm), modifier
+                    continue
+
+                count = operand_counts[mnemonic]
+                if count == 3:
+                    tokens = (mnemonic, op1, op2, op3)
+                elif count == 2:
+                    tokens = (mnemonic, op1, op2)
+                elif count == 1:
+                    tokens = (mnemonic, op1)
+                else:
+                    tokens = (mnemonic,)
+                if not tokens[-1] or (count < 3 and (op1, op2, op3)[count]) or rest.strip():
+                    errors.append((lineno, f"'{mnemonic}' expects {count} operand(s)"))
+                    continue
+                yield lineno, "instr", tokens, modifier
+
+            elif head[0] == ".":
+                label = head.rstrip(":")
+                if label in self.directives and op1 and not op2:
+                    origin = self.to_int(op1.rstrip(":"))
+                    if origin is None:
+                        errors.append((lineno, f"Invalid address '{op1}' for {label}"))
+                    else:
+                        yield lineno, "origin", origin, None
+                elif head[-1] == ":" and not op1:
+                    yield lineno, "label", label, None
+                else:
+                    errors.append((lineno, f"Invalid label '{head}'"))
+
+            elif head[-1] in ("u", "h") and head[:-1] in self.opcode_values:
+                errors.append((lineno, f"Modifier 'u' or 'h' cannot be used with instruction '{head}'"))
+            else:
+                errors.append((lineno, f"Invalid instruction '{head}'"))
+
+    def read_chunks(self, chunk_size=1 << 20):
+        # Yields (first line number, text) for blocks of whole lines of about chunk_size bytes.
+        # The filename "-" reads stdin, block by block as it arrives.
+        if self.source is not None:
+            source = io.StringIO(self.source)
+        else:
+            source = nullcontext(sys.stdin) if self.filename == "-" else open(self.filename, "r")
+        with source as file:
+            lineno = 1
+            while True:
+                lines = file.readlines(chunk_size)
+                if not lines:
+                    return
+                yield lineno, "".join(lines)
+                lineno += len(lines)
+                self.lines_read = lineno - 1
+
+    def records(self):
+        # The lexed lines of the program, after .include, .macro and .equ are expanded;
+        # self.includes collects (path, mtime) of the files included on the way
+        preprocessor = Preprocessor(self)
+        self.includes = preprocessor.included
+        return preprocessor.run(self.read_chunks(), self.filename)
+
+    @timed("assemble")
+    def parse_data(self, keep_instructions=True):
+        # Single pass: every instruction is encoded as soon as it is lexed. A branch to a label
+        # that is not defined yet is emitted with its opcode only and recorded in a fixup table
+        # under that label; the label's definition patches the 27-bit offset into those words.
+        # References still pending at the end are reported as undefined. Every .org opens a new
+        # section at its address. Without keep_instructions only the label table and the
+        # section layout are built (streaming pass 1): each instruction is still trial-encoded
+        # and the labels it references are checked, but no word is stored. When relocatable,
+        # references left open go to self.relocations as (section words, index, label, line)
+        # instead.
+        sections = []
+        base, count, words, origin_lineno = 0x0000, 0, array("I"), None
+        placed = 0
+        fixups = {}
+        labels = self.labels
+        label_sections = self.label_sections
+        relocatable = self.relocatable
+        errors = self.errors
+        tokenized = self.tokenized_instructions
+        encoders = self.encoders
+        encode_branch = Assembler.encode_branch
+        try:
+            for lineno, kind, value, modifier in self.records():
+                if kind == "instr":
+                    address = base + count * 4
+                    encoder = encoders[value[0]]
+                    if encoder is encode_branch and (value[1] not in labels or relocatable and label_sections[value[1]] is not words):
+                        if keep_instructions:
+                            fixups.setdefault(value[1], []).append((words, count, address, lineno))
                         else:
-                            self.labels[label] = address
+                            # only the first forward reference to each label is kept
+                            fixups.setdefault(value[1], [(None, count, address, lineno)])
+                        word = self.opcode_values[value[0]] << 27
+                    else:
+                        try:
+                            word = encoder(self, address, value, modifier)
+                        except ValueError as e:
+                            errors.append((lineno, str(e)))
+                            word = 0
+                    if keep_instructions:
+                        tokenized.append((address, value, modifier, lineno))
+                        words.append(word)
+                    count += 1
+                elif kind == "label":
+                    if value in labels:
+                        errors.append((lineno, f"Duplicate label '{value}'"))
                         continue
-                    self.instructions.append((address, clean_line))
-                    address += 4
+                    labels[value] = base + count * 4
+                    label_sections[value] = words
+                    for branch_words, index, address, branch_lineno in fixups.pop(value, ()):
+                        if relocatable and branch_words is not words:
+                            self.relocations.append((branch_words, index, value, branch_lineno))
+                            continue
+                        try:
+                            field = self.int_27b_field(labels[value] - address)
+                        except ValueError as e:
+                            errors.append((branch_lineno, str(e)))
+                            continue
+                        if branch_words is not None:
+                            branch_words[index] |= field
+                else:
+                    placed += count
+                    if not placed:
+                        # an origin ahead of all code also moves the labels written before it
+                        for label in labels:
+                            labels[label] += value - base
+                    sections.append((base, count, words, origin_lineno))
+                    base, count, words, origin_lineno = value, 0, array("I"), lineno
         except FileNotFoundError:
-            print(f"Error: File '{self.filename}' not found.")
+            print(f"Error: File '{self.filename}' not found.", file=sys.stderr)
             sys.exit(1)
+        sections.append((base, count, words, origin_lineno))
+        for label, references in fixups.items():
+            if relocatable:
+                self.relocations.extend((branch_words, index, label, lineno) for branch_words, index, _, lineno in references)
+            else:
+                errors.extend((lineno, f"Undefined label '{label}'") for _, _, _, lineno in references)
+        self.place_sections(sections, keep_instructions)
+        if self.stats is not None:
+            self.stats.count("lines", self.lines_read)
+            self.stats.count("labels", len(self.labels))
+            self.stats.count("sections", len(self.segments))
+            for segment in self.segments:
+                self.count_words(segment.words())
 
-    def update_addresses(self):
-        if self.start_address != 0x0000:
-            offset = self.start_address - 0x0000
-            self.instructions = [(addr + offset, instr) for addr, instr in self.instructions]
-            self.labels = {lbl: (addr + offset if addr is not None else None) for lbl, addr in self.labels.items()}
-    
-    def tokenize_instructions(self):
-        for address, instruction in self.instructions:
-            tokens = None  
+    def place_sections(self, sections, keep_instructions=True):
+        # sections: (origin, instruction count, words, line of the .org) in source order. Empty
+        # ones are dropped and overlapping ones reported; the first one holding code gives
+        # start_address.
+        used = [(base, count, words, lineno) for base, count, words, lineno in sections if count]
+        self.sections = used
+        self.start_address = used[0][0] if used else sections[-1][0]
+        self.layout = [(base, base + count * 4) for base, count, _, _ in used]
+        # a relocatable section (lineno None) has no address yet, so it cannot overlap
+        layout = sorted(((base, base + count * 4, lineno or 0) for base, count, _, lineno in used
+                         if not (self.relocatable and lineno is None)), key=lambda section: section[:2])
+        for (_, end, first_lineno), (base, _, lineno) in zip(layout, layout[1:]):
+            if base < end:
+                self.errors.append((max(first_lineno, lineno), f"Section at 0x{base:X} overlaps another one ending at 0x{end:X}"))
+        self.segments = SegmentMap([Image(base, words) for base, _, words, _ in used] if keep_instructions else [], self.entry_point())
+
+    def entry_point(self):
+        return self.labels.get(".main", self.start_address)
 
-            if instruction[:2] in ("ld", "st"):
-                match = re.match(r'(\w+)\s+(\w+)\.(0x[0-9a-fA-F]+|0b[01]+|\d+)\[(\w+)\]', instruction)
-                if match:
-                    mnemonic, rd, imm, rs1 = match.groups()
-                    tokens = [mnemonic, rd, rs1, imm]  
+    # Streaming pass 1: only the label table and the section layout are kept, so memory stays
+    # proportional to the number of labels. Follow with iter_tokens()/iter_encoded().
+    def parse_labels(self):
+        self.parse_data(keep_instructions=False)
 
-            if tokens is None:
-                tokens = instruction.replace(" ", ",").split(",")
-                tokens = list(filter(None, tokens))
+    # Streaming pass 2: re-read the source and yield tokenized instructions one at a time.
+    def iter_tokens(self):
+        address = 0x0000
+        for lineno, kind, value, modifier in self.records():
+            if kind == "instr":
+                yield address, value, modifier, lineno
+                address += 4
+            elif kind == "origin":
+                address = value
 
-            if not tokens:
+    def iter_encoded(self, tokenized=None):
+        for address, instr, modifier, lineno in (self.iter_tokens() if tokenized is None else tokenized):
+            try:
+                word = self.encoders[instr[0]](self, address, instr, modifier)
+            except ValueError as e:
+                self.errors.append((lineno, str(e)))
                 continue
+            yield address, word
 
-            mnemonic = tokens[0]
-            modifier = "00"  
+    # Every encoder returns the 32-bit word as an int:
+    # opcode[31:27] imm[26] rd[25:22] rs1[21:18] (rs2[17:14] | mod[17:16] imm16[15:0])
+    def encode_zero(self, address, instr, modifier):
+        return self.opcode_values[instr[0]] << 27
 
-            if mnemonic.endswith("u") or mnemonic.endswith("h"):
-                base_mnemonic = mnemonic[:-1]
-                if base_mnemonic in self.mod_opcodes:
-                    modifier = "01" if mnemonic[-1] == "u" else "10"
-                    mnemonic = base_mnemonic
-                else:
-                    print(f"Error: Modifier 'u' or 'h' cannot be used with instruction '{mnemonic}'")
-                    sys.exit(1)
+    def encode_branch(self, address, instr, modifier):
+        if instr[1] not in self.labels:
+            raise ValueError(f"Undefined label '{instr[1]}'")
+        return self.opcode_values[instr[0]] << 27 | self.int_27b_field(self.labels[instr[1]] - address)
 
-            if mnemonic not in self.opcodes:
-                print(f"Error: Invalid instruction '{mnemonic}'")
-                sys.exit(1)
+    def encode_two(self, address, instr, modifier):
+        word = self.opcode_values[instr[0]] << 27 | self.reg_field(instr[1]) << 22
+        imm = self.to_int(instr[2])
+        if imm is not None:
+            return word | 1 << 26 | self.imm_field(imm, 16, "s")
+        return word | self.reg_field(instr[2]) << 14
 
-            self.tokenized_instructions.append((address, [mnemonic] + tokens[1:], modifier))
-    
-    def encode_tokens(self):
-        for address,instr,modifer in self.tokenized_instructions:
-            if instr[0] in ['nop','ret','hlt']:
-                self.instruction_encoded.append((address,self.opcodes[instr[0]]+27*"0"))
-            elif instr[0] in ['b','beq','bgt','call']:
-                if instr[1] in self.labels.keys():
-                    self.instruction_encoded.append((address,self.opcodes[instr[0]]+self.int_27b_binary(self.labels[instr[1]]-address)))
-            elif instr[0] in ['not','mov']:
-                if self.to_int(instr[2]) != None:
-                    self.instruction_encoded.append((address,self.opcodes[instr[0]]+"1"+self.reg_to_bin(instr[1])+"0000"+"00"+self.int_to_bin(self.to_int(instr[2]),16,"s")))
-                else: 
-                    self.instruction_encoded.append((address,self.opcodes[instr[0]]+"0"+self.reg_to_bin(instr[1])+"0000"+self.reg_to_bin(instr[2])+self.int_to_bin(0,14,"s")))
-            elif instr[0] in ['cmp']:
-                if self.to_int(instr[2]) != None:
-                    self.instruction_encoded.append((address,self.opcodes[instr[0]]+"1"+"0000"+self.reg_to_bin(instr[1])+"00"+self.int_to_bin(self.to_int(instr[2]),16,"s")))
-                else: 
-                    self.instruction_encoded.append((address,self.opcodes[instr[0]]+"0"+"0000"+self.reg_to_bin(instr[1])+self.reg_to_bin(instr[2])+self.int_to_bin(0,14,"s")))
-            elif instr[0] in ['add', 'sub', 'mul', 'div', 'mod', 'and', 'or', 'lsl', 'lsr', 'asr']:
-                if modifer == "00":
-                    if self.to_int(instr[3]) != None:
-                        self.instruction_encoded.append((address,self.opcodes[instr[0]]+"1"+self.reg_to_bin(instr[1])+self.reg_to_bin(instr[2])+"00"+self.int_to_bin(self.to_int(instr[3]),16,"s")))
-                    else: 
-                        self.instruction_encoded.append((address,self.opcodes[instr[0]]+"0"+self.reg_to_bin(instr[1])+self.reg_to_bin(instr[2])+self.reg_to_bin(instr[3])+self.int_to_bin(0,14,"s")))
-                if modifer == "01":
-                    if self.to_int(instr[3]) != None:
-                        self.instruction_encoded.append((address,self.opcodes[instr[0]]+"1"+self.reg_to_bin(instr[1])+self.reg_to_bin(instr[2])+"01"+self.int_to_bin(self.to_int(instr[3]),16,"u")))
-                    else: 
-                        self.instruction_encoded.append((address,self.opcodes[instr[0]]+"0"+self.reg_to_bin(instr[1])+self.reg_to_bin(instr[2])+self.reg_to_bin(instr[3])+self.int_to_bin(0,14,"s")))
-                if modifer == "10":
-                    if self.to_int(instr[3]) != None:
-                        self.instruction_encoded.append((address,self.opcodes[instr[0]]+"1"+self.reg_to_bin(instr[1])+self.reg_to_bin(instr[2])+"10"+self.int_to_bin(self.to_int(instr[3]),16,"s")))
-                    else: 
-                        self.instruction_encoded.append((address,self.opcodes[instr[0]]+"0"+self.reg_to_bin(instr[1])+self.reg_to_bin(instr[2])+self.reg_to_bin(instr[3])+self.int_to_bin(0,14,"s")))
-            elif instr[0] in ['ld','st']:
-                if self.to_int(instr[3]) != None:
-                    self.instruction_encoded.append((address,self.opcodes[instr[0]]+"1"+self.reg_to_bin(instr[1])+self.reg_to_bin(instr[2])+"00"+self.int_to_bin(self.to_int(instr[3]),16,"s")))
-                else: 
-                    print(f"The instruction requires you to pass immediate value not two registers.")
-            else:
-                print(f"The Instruction {instr} with the modifer : {modifer} is in valid.")
+    def encode_cmp(self, address, instr, modifier):
+        word = self.opcode_values[instr[0]] << 27 | self.reg_field(instr[1]) << 18
+        imm = self.to_int(instr[2])
+        if imm is not None:
+            return word | 1 << 26 | self.imm_field(imm, 16, "s")
+        return word | self.reg_field(instr[2]) << 14
+
+    def encode_three(self, address, instr, modifier):
+        word = self.opcode_values[instr[0]] << 27 | self.reg_field(instr[1]) << 22 | self.reg_field(instr[2]) << 18
+        imm = self.to_int(instr[3])
+        if imm is not None:
+            mode = "u" if modifier == "01" else "s"
+            return word | 1 << 26 | int(modifier, 2) << 16 | self.imm_field(imm, 16, mode)
+        return word | self.reg_field(instr[3]) << 14
+
+    def encode_mem(self, address, instr, modifier):
+        return (self.opcode_values[instr[0]] << 27 | 1 << 26 | self.reg_field(instr[1]) << 22
+                | self.reg_field(instr[2]) << 18 | self.imm_field(self.to_int(instr[3]), 16, "s"))
+
+    # mnemonic -> encoder, through the format isa.py gives it
+    format_encoders = {"zero": encode_zero, "branch": encode_branch, "two": encode_two, "cmp": encode_cmp,
+                       "three": encode_three, "mem": encode_mem}
+    encoders = dict(zip(isa.formats, map(format_encoders.__getitem__, isa.formats.values())))
 
+    def count_words(self, words):
+        # Instructions per opcode; every encoded branch is one resolved label reference.
+        counts = self.stats.count_opcodes(words, self.opcode_names)
+        self.stats.count("instructions", len(words))
+        self.stats.count("labels_resolved", sum(counts[mnemonic] for mnemonic in ("b", "beq", "bgt", "call")))
+
+    def print_encoded(self, encoded=None, file=None):
+        for address, word in (self.segments.entries() if encoded is None else encoded):
+            print(f"{format(address, 'X')}: {word:032b}", file=file)
+
+    # output format -> (default file name, file mode, suffix in batch mode);
+    # Image.render_<format> produces the content, framing() the header and footer
+    output_formats = {
+        "bin": ("output.bin", "wb", ".bin"),
+        "hex": ("output.hex", "w", ".hex"),
+        "bintxt": ("outputbin.txt", "w", "_bin.txt"),
+        "hextxt": ("outputhex.txt", "w", "_hex.txt"),
+        "seg": ("output.seg", "wb", ".seg"),
+        "ihex": ("output.ihx", "w", ".ihx"),
+        "srec": ("output.srec", "w", ".srec"),
+    }
 
-    def print_encoded(self):
-        for address, binval in self.instruction_encoded:
-            print(f"{format(address, 'X')}: {binval}")
-    import os
+    def runs(self, encoded, batch_size=65536):
+        # Packs a stream of (address, word) pairs into Images of at most batch_size consecutive words
+        start = end = None
+        words = array("I")
+        for address, word in encoded:
+            if address != end or len(words) == batch_size:
+                if words:
+                    yield Image(start, words)
+                start = address
+                words = array("I")
+            words.append(word)
+            end = address + 4
+        if words:
+            yield Image(start, words)
+
+    @timed("write")
+    def write_outputs(self, outputs, encoded=None, batch_size=65536, file=None):
+        # outputs maps format name -> filename, "-" meaning stdout. The program is walked once:
+        # every segment (or every batch of a stream of (address, word) pairs, so a streamed
+        # program is never held in memory as a whole) is rendered in each format and handed to
+        # its file in one write. The flat formats get the gaps between sections as zero words,
+        # batch by batch, so a streamed program needs its sections in address order for them;
+        # the sparse ones only write the words that exist. Each file is written under a temporary
+        # name and only renamed into place once the whole program has encoded, so an error met
+        # while streaming leaves no partial output behind.
+        if encoded is not None and outputs.keys() - SegmentMap.sparse_formats and self.layout != sorted(self.layout):
+            raise ValueError("Flat outputs of a streamed program need its sections in ascending address order")
+        runs = self.segments if encoded is None else self.runs(encoded, batch_size)
+        entry = self.entry_point()
+        files = {}
+        sizes = dict.fromkeys(outputs, 0)
+        errors = len(self.errors)
+        complete = False
+
+        def write(fmt, content):
+            files[fmt].write(content)
+            sizes[fmt] += len(content)
+
+        try:
+            for fmt, filename in outputs.items():
+                binary = self.output_formats[fmt][1] == "wb"
+                if filename == "-":
+                    files[fmt] = sys.stdout.buffer if binary else sys.stdout
+                else:
+                    files[fmt] = open(filename + ".tmp", self.output_formats[fmt][1])
+                write(fmt, framing(fmt, entry)[0])
+            end = None
+            for run in runs:
+                if end is not None and run.start_address != end:
+                    gap = range(end, run.start_address, 4 * batch_size)
+                    for fmt in files:
+                        if fmt not in SegmentMap.sparse_formats:
+                            for address in gap:
+                                write(fmt, getattr(Image(address, [0] * min(batch_size, (run.start_address - address) // 4)), "render_" + fmt)())
+                for fmt in files:
+                    write(fmt, getattr(run, "render_" + fmt)())
+                end = run.start_address + len(run)
+                if encoded is not None and self.stats is not None:
+                    self.count_words(run.words())
+            for fmt in files:
+                write(fmt, framing(fmt, entry)[1])
+            complete = len(self.errors) == errors
+        finally:
+            for fmt, f in files.items():
+                if outputs[fmt] == "-":
+                    f.flush()
+                else:
+                    f.close()
+                    if complete:
+                        os.replace(outputs[fmt] + ".tmp", outputs[fmt])
+                    else:
+                        os.remove(outputs[fmt] + ".tmp")
+        if not complete:
+            return
+        for fmt, filename in outputs.items():
+            if self.stats is not None:
+                self.stats.bytes_written[fmt] += sizes[fmt]
+            name = "<stdout>" if filename == "-" else f"'{filename}'"
+            print(f"File {name} written successfully. Size: {sizes[fmt]} bytes", file=file)
 
     def print_bin(self,filename="output.bin"):
-        with open(filename, "wb") as f:
-            for _, binval in self.instruction_encoded:
-                f.write(int(binval, 2).to_bytes(4, byteorder='big'))
-        print(f"File '{filename}' written successfully. Size: {os.path.getsize(filename)} bytes") 
+        self.write_outputs({"bin": filename})
 
     def print_hex(self,filename="output.hex"):
-    	with open(filename, "w") as f:
-            for _, binval in self.instruction_encoded:
-            	f.write(f"{int(binval, 2):08X}\n")
-    	print(f"File '{filename}' written successfully. Size: {os.path.getsize(filename)} bytes")
+        self.write_outputs({"hex": filename})
 
     def print_bintxt(self, filename="outputbin.txt"):
-    	with open(filename, "w") as f:
-            for addr, binval in self.instruction_encoded:
-                f.write(f"{binval}\n")
-    	print(f"File '{filename}' written successfully. Size: {os.path.getsize(filename)} bytes") 
+        self.write_outputs({"bintxt": filename})
 
     def print_hextxt(self, filename="outputhex.txt"):
-    	with open(filename, "w") as f:
-            for addr, binval in self.instruction_encoded:
-            	hex_val = f"{int(binval, 2):08X}"  
-            	formatted_hex = " ".join(hex_val[i:i+2] for i in range(0, len(hex_val), 2))
-            	f.write(formatted_hex + "\n")
-    	print(f"File '{filename}' written successfully. Size: {os.path.getsize(filename)} bytes")
- 
-
-    def print_tokenized_data(self):
-        for address, tokens, modifier in self.tokenized_instructions:
-            print(f"{format(address, 'X')}: {tokens} {modifier}")
-        print(self.labels)
+        self.write_outputs({"hextxt": filename})
+
+    def print_tokenized_data(self, tokenized=None, file=None):
+        for address, tokens, modifier, _ in (self.tokenized_instructions if tokenized is None else tokenized):
+            print(f"{format(address, 'X')}: {list(tokens)} {modifier}", file=file)
+        print(self.labels, file=file)
+
+    def print_errors(self, file=None):
+        for lineno, message in sorted(set(self.errors)):
+            print(f"Error: {Preprocessor.where(lineno)}: {message}", file=file)
         
 
+def assemble_source(source, name="<source>", allow_include=True):
+    # String in, segments out: runs the whole pipeline in memory. There are no segments when
+    # the program has errors; they are left in assembler.errors.
+    assembler = Assembler(name, source)
+    assembler.allow_include = allow_include
+    assembler.parse_data()
+    if assembler.errors:
+        assembler.segments = SegmentMap([], assembler.entry_point())
+    return assembler
+
+
+class IncrementalAssembler(Assembler):
+    # Reassembles the same file repeatedly. The source is cut into blocks at label and directive
+    # lines, and each block's lexing and encoding is cached by its text, so after an edit only
+    # the touched blocks are redone. Branch words are patched afterwards since their offsets
+    # move with the layout.
+    block_pattern = re.compile(r"^(?=[ \t]*\.)", re.M)
+
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.block_cache = {}
+        self.blocks = []
+        self.changed_blocks = 0
+
+    def compile_block(self, text):
+        # Addresses and line numbers in the result are relative to the start of the block:
+        # (labels with their lines, origin, words with 0 for branches, branches, tokenized, errors,
+        # line count)
+        errors, self.errors = self.errors, []
+        labels, branches, tokenized = [], [], []
+        words = array("I")
+        origin = None
+        for lineno, kind, value, modifier in self.lex(text):
+            if kind == "instr":
+                address = len(words) * 4
+                encoder = self.encoders[value[0]]
+                word = 0
+                if encoder is Assembler.encode_branch:
+                    branches.append((len(words), value, lineno))
+                else:
+                    try:
+                        word = encoder(self, address, value, modifier)
+                    except ValueError as e:
+                        self.errors.append((lineno, str(e)))
+                words.append(word)
+                tokenized.append((address, value, modifier, lineno))
+            elif kind == "label":
+                labels.append((value, len(words) * 4, lineno))
+            else:
+                origin = value
+        block = (labels, origin, words, branches, tokenized, self.errors, text.count("\n"))
+        self.errors = errors
+        return block
+
+    def reassemble(self):
+        try:
+            with open(self.filename, "r") as file:
+                source = file.read()
+        except FileNotFoundError:
+            print(f"Error: File '{self.filename}' not found.", file=sys.stderr)
+            return False
+
+        if Preprocessor.directive_pattern.search(source):
+            # includes and macros change the meaning of every later block, so such a file is
+            # assembled whole (included files and expansions stay memoized between runs)
+            self.block_cache, self.blocks, self.changed_blocks = {}, [], 0
+            self.labels, self.label_sections, self.errors, self.tokenized_instructions = {}, {}, [], []
+            self.source = source
+            try:
+                self.parse_data()
+            finally:
+                self.source = None
+            return not self.errors
+
+        cache, self.block_cache = self.block_cache, {}
+        self.labels = {}
+        self.errors = []
+        self.blocks = []
+        self.changed_blocks = 0
+        sections = []
+        base, words, origin_lineno = 0x0000, array("I"), None
+        placed = 0
+        fixups = []
+        first_lineno = 1
+        for text in self.block_pattern.split(source):
+            block = cache.get(text)
+            if block is None:
+                block = self.compile_block(text)
+                self.changed_blocks += 1
+            self.block_cache[text] = block
+            labels, origin, block_words, branches, _, errors, line_count = block
+
+            # a directive always starts its block, so the origin covers the whole block
+            if origin is not None:
+                placed += len(words)
+                if not placed:
+                    for label in self.labels:
+                        self.labels[label] += origin - base
+                sections.append((base, len(words), words, origin_lineno))
+                base, words, origin_lineno = origin, array("I"), first_lineno
+            address = base + len(words) * 4
+            for label, offset, lineno in labels:
+                if label in self.labels:
+                    self.errors.append((first_lineno + lineno - 1, f"Duplicate label '{label}'"))
+                    continue
+                self.labels[label] = address + offset
+            fixups.extend((words, len(words) + index, address + index * 4, instr, first_lineno + lineno - 1) for index, instr, lineno in branches)
+            self.errors.extend((first_lineno + lineno - 1, message) for lineno, message in errors)
+            self.blocks.append((block, address, first_lineno))
+            words.extend(block_words)
+            first_lineno += line_count
+        sections.append((base, len(words), words, origin_lineno))
+
+        for branch_words, index, address, instr, lineno in fixups:
+            try:
+                branch_words[index] = self.encode_branch(address, instr, "00")
+            except ValueError as e:
+                self.errors.append((lineno, str(e)))
+        self.tokenized_instructions = []
+        self.place_sections(sections)
+        return not self.errors
+
+    def print_tokenized_data(self, tokenized=None, file=None):
+        if tokenized is None and self.blocks:
+            tokenized = ((base + address, tokens, modifier, first_lineno + lineno - 1)
+                         for block, base, first_lineno in self.blocks
+                         for address, tokens, modifier, lineno in block[4])
+        super().print_tokenized_data(tokenized, file)
+
+    def watch(self, emit, interval=0.2):
+        # Rebuild whenever the file's mtime changes and hand the result to emit(self).
+        last_mtime = None
+        try:
+            while True:
+                try:
+                    mtime = os.stat(self.filename).st_mtime_ns
+                except FileNotFoundError:
+                    mtime = None
+                if mtime is not None and mtime != last_mtime:
+                    last_mtime = mtime
+                    started = time.perf_counter()
+                    if self.reassemble():
+                        emit(self)
+                        elapsed = (time.perf_counter() - started) * 1000
+                        print(f"Reassembled {sum(map(len, self.segments)) // 4} instructions "
+                              f"({self.changed_blocks} changed blocks) in {elapsed:.1f} ms")
+                    else:
+                        self.print_errors()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def batch_outputs(path, formats, outdir=None):
+    # Per-input output paths for batch mode: prog.s -> prog.bin, prog.hex, prog_bin.txt, prog_hex.txt
+    stem = os.path.join(outdir if outdir is not None else os.path.dirname(path), os.path.splitext(os.path.basename(path))[0])
+    return {fmt: stem + Assembler.output_formats[fmt][2] for fmt in formats}
+
+
+def assemble_file(path, outputs, collect_stats=False):
+    # Batch worker (runs in a pool process): returns (path, lines, instructions, errors, stats),
+    # stats being Stats.as_dict() when collect_stats is set and None otherwise.
+    assembler = Assembler(path, stats=Stats() if collect_stats else None)
+    assembler.parse_data()
+    errors = [f"{Preprocessor.where(lineno)}: {message}" for lineno, message in sorted(set(assembler.errors))]
+    if not errors:
+        assembler.write_outputs(outputs, file=io.StringIO())
+    stats = assembler.stats.as_dict() if collect_stats else None
+    return path, assembler.lines_read, sum(map(len, assembler.segments)) // 4, errors, stats
+
+
+def assemble_batch(paths, formats, jobs=None, outdir=None, stats=None):
+    # stats, when given, receives the merged statistics of every assembled file
+    started = time.perf_counter()
+    lines = instructions = 0
+    failures = []
+    work = []
+    if outdir is not None:
+        os.makedirs(outdir, exist_ok=True)
+    for path in paths:
+        if os.path.isfile(path):
+            work.append((path, batch_outputs(path, formats, outdir)))
+        else:
+            failures.append((path, ["file not found"]))
+
+    pool = None if jobs == 1 or len(work) <= 1 else ProcessPoolExecutor(jobs)
+    try:
+        collect_stats = stats is not None
+        futures = [pool.submit(assemble_file, path, outputs, collect_stats) if pool else None for path, outputs in work]
+        for (path, outputs), future in zip(work, futures):
+            try:
+                _, file_lines, file_instructions, errors, file_stats = future.result() if future else assemble_file(path, outputs, collect_stats)
+            except Exception as e:
+                failures.append((path, [str(e)]))
+                continue
+            if file_stats is not None:
+                stats.merge(file_stats)
+            lines += file_lines
+            instructions += file_instructions
+            if errors:
+                failures.append((path, errors))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    for path, errors in failures:
+        for error in errors:
+            print(f"Error: {path}: {error}")
+    print(f"Assembled {len(paths) - len(failures)}/{len(paths)} files ({len(failures)} failed), "
+          f"{lines} lines, {instructions} instructions in {elapsed:.2f} s: "
+          f"{len(paths) / elapsed:.1f} files/sec, {lines / elapsed:.0f} lines/sec")
+    return not failures
+
+
+# output format -> (short option, long option, help)
+output_options = {
+    "bin": ("-b", "--bin", "Generate binary output"),
+    "hex": ("-hh", "--hex", "Generate hex output"),
+    "bintxt": ("-tb", "--txtbin", "Generate binary output in text file"),
+    "hextxt": ("-th", "--txthex", "Generate hex output in text file"),
+    "seg": ("-sg", "--seg", "Generate a segment container (.seg): only the bytes of each section"),
+    "ihex": ("-ih", "--ihex", "Generate Intel HEX output"),
+    "srec": ("-sr", "--srec", "Generate Motorola S-record output"),
+}
+
+
+def add_output_arguments(parser):
+    for fmt, (short, long, text) in output_options.items():
+        parser.add_argument(short, long, dest=fmt, nargs="?", const="", metavar="PATH", help=f"{text} (to PATH, - for stdout)")
+
+
+def output_paths(parser, args):
+    # format -> path of every requested output; a format flag without PATH writes the format's
+    # default file (output.bin, ...), or stdout when the input is stdin (-f -)
+    from_stdin = getattr(args, "file", None) == ["-"]
+    outputs = {fmt: getattr(args, fmt) or ("-" if from_stdin else Assembler.output_formats[fmt][0])
+               for fmt in output_options if getattr(args, fmt) is not None}
+    if len(set(outputs.values())) != len(outputs):
+        parser.error("each output needs its own path (only one can be -, stdout)")
+    if "-" in outputs.values() and (getattr(args, "tokens", False) or args.encode):
+        parser.error("-t and -e cannot be combined with an output to stdout")
+    return outputs
+
+
+def expand_paths(patterns):
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern])
+    return paths
+
+
 def main():
     parser = argparse.ArgumentParser(description="SimpleRisc Assembler")
-    parser.add_argument("-f", "--file", required=True, help="Assembly file to parse")
+    parser.add_argument("-f", "--file", required=True, nargs="+", help="Assembly file(s) or glob pattern(s) to parse, - for stdin")
     parser.add_argument("-t", "--tokens", action="store_true", help="Print tokenized instructions")
     parser.add_argument("-e", "--encode", action="store_true", help="Print encoded instructions")
-    parser.add_argument("-b", "--bin", action="store_true", help="Generate binary output")
-    parser.add_argument("-hh", "--hex", action="store_true", help="Generate hex output")
-    parser.add_argument("-tb", "--txtbin", action="store_true", help="Generate binary output in text file")
-    parser.add_argument("-th", "--txthex", action="store_true", help="Generate hex output in text file")
+    add_output_arguments(parser)
+    parser.add_argument("-s", "--stream", action="store_true", help="Two-pass streaming mode: keep only the label table in memory")
+    parser.add_argument("-w", "--watch", action="store_true", help="Stay running and reassemble incrementally whenever the file changes")
+    parser.add_argument("-j", "--jobs", type=int, help="Batch mode: assemble the inputs with N worker processes (default: one per CPU)")
+    parser.add_argument("-O", "--outdir", help="Batch mode: directory for the per-input outputs (default: next to each input)")
+    parser.add_argument("--stats", action="store_true", help="Print per-phase timings, counters and peak memory to stderr")
 
     args = parser.parse_args()
-    assembler = Assembler(args.file)
-    assembler.parse_data()
-    assembler.update_addresses()
-    assembler.tokenize_instructions()
-    assembler.encode_tokens()
-
-    if args.tokens:
-        assembler.print_tokenized_data()
-    if args.encode:
-        assembler.print_encoded()
-    if args.bin:
-        assembler.print_bin()
-    if args.hex:
-        assembler.print_hex()
-    if args.txtbin:
-        assembler.print_bintxt()
-    if args.txthex:
-        assembler.print_hextxt()
+    paths = expand_paths(args.file)
+    outputs = output_paths(parser, args)
+    formats = list(outputs)
+    to_stdout = "-" in outputs.values()
+    stats = Stats() if args.stats else None
+    if args.stats and args.watch:
+        parser.error("--stats cannot be combined with --watch")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    if "-" in paths and (len(paths) != 1 or args.stream or args.watch or args.jobs is not None or args.outdir is not None):
+        parser.error("stdin (-f -) is read once, as the only input: it cannot be batched, streamed in two passes or watched")
+
+    if len(paths) != 1 or args.jobs is not None or args.outdir is not None:
+        if args.tokens or args.encode or args.stream or args.watch:
+            parser.error("-t, -e, --stream and --watch work on a single input file")
+        if any(getattr(args, fmt) for fmt in formats):
+            parser.error("output paths work on a single input file; use -O for batch mode")
+        targets = [target for path in paths for target in batch_outputs(path, formats, args.outdir).values()]
+        if len(set(targets)) != len(targets):
+            parser.error("several inputs map to the same output file; use distinct file names")
+        ok = assemble_batch(paths, formats, args.jobs, args.outdir, stats)
+        if stats is not None:
+            stats.report(sys.stderr)
+        if not ok:
+            sys.exit(1)
+        return
+
+    args.file = paths[0]
+    assembler = Assembler(args.file, stats=stats)
+    # with an output on stdout the status messages move to stderr
+    status = sys.stderr if to_stdout else None
+
+    def emit(assembler):
+        if args.tokens:
+            assembler.print_tokenized_data()
+        if args.encode:
+            assembler.print_encoded()
+        if outputs:
+            assembler.write_outputs(outputs, file=status)
+
+    if args.watch:
+        IncrementalAssembler(args.file).watch(emit)
+        return
+
+    if args.stream:
+        assembler.parse_labels()
+        if not assembler.errors:
+            if args.tokens:
+                assembler.print_tokenized_data(assembler.iter_tokens())
+            if args.encode:
+                assembler.print_encoded(assembler.iter_encoded())
+            if outputs:
+                try:
+                    assembler.write_outputs(outputs, assembler.iter_encoded(), file=status)
+                except ValueError as e:
+                    print(f"Error: {e}", file=status)
+                    sys.exit(1)
+    else:
+        assembler.parse_data()
+        if not assembler.errors:
+            emit(assembler)
+    if stats is not None:
+        stats.report(sys.stderr)
+    if assembler.errors:
+        assembler.print_errors(file=status)
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,73 @@
+import argparse
+import random
+
+alu_ops = ["add", "sub", "mul", "div", "mod", "and", "or", "lsl", "lsr", "asr"]
+branch_ops = ["b", "beq", "bgt", "call"]
+
+
+def generate_program(size, seed=0, label_density=0.02, mem_ratio=0.1, modifier_ratio=0.2, branch_ratio=0.1, origin=None):
+    # A valid SimpleRisc program of `size` instructions. label_density is the chance of a label
+    # before each instruction, mem_ratio / branch_ratio the share of ld/st and b/beq/bgt/call,
+    # modifier_ratio the share of ALU instructions using u/h. Branches only target labels that
+    # are defined somewhere in the program, and the same seed always gives the same program.
+    rng = random.Random(seed)
+    reg = lambda: f"r{rng.randrange(16)}"
+    lines = [f"; generated: size={size} seed={seed}"]
+    if origin is not None:
+        lines.append(f".org {origin:#x}:")
+    lines.append(".main:")
+    labels = [".main"]
+    pending_branches = []
+
+    for i in range(size):
+        if i and rng.random() < label_density:
+            labels.append(f".l{i}")
+            lines.append(f".l{i}:")
+        kind = rng.random()
+        if kind < mem_ratio:
+            lines.append(f"    {rng.choice(('ld', 'st'))} {reg()}, {rng.randrange(-2048, 2048) * 4}[{reg()}]")
+        elif kind < mem_ratio + branch_ratio:
+            # the target is picked once every label exists, so forward branches are allowed
+            pending_branches.append(len(lines))
+            lines.append(rng.choice(branch_ops))
+        elif kind < 0.85:
+            op = rng.choice(alu_ops)
+            modifier = rng.choice("uh") if rng.random() < modifier_ratio else ""
+            if rng.random() < 0.5:
+                operand = reg()
+            elif modifier == "u":
+                operand = str(rng.randrange(0, 65536))
+            else:
+                operand = str(rng.randrange(-32768, 32768))
+            lines.append(f"    {op}{modifier} {reg()}, {reg()}, {operand}")
+        elif kind < 0.95:
+            op = rng.choice(("mov", "not", "cmp"))
+            operand = reg() if rng.random() < 0.5 else rng.choice((str(rng.randrange(-32768, 32768)), hex(rng.randrange(0x8000)), bin(rng.randrange(256))))
+            lines.append(f"    {op} {reg()}, {operand}")
+        else:
+            lines.append(f"    {rng.choice(('nop', 'ret'))}")
+    lines.append("    hlt")
+
+    for index in pending_branches:
+        lines[index] = f"    {lines[index]} {rng.choice(labels)}"
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a random but valid SimpleRisc program")
+    parser.add_argument("-n", "--size", type=int, default=1000, help="Number of instructions")
+    parser.add_argument("-o", "--output", required=True, help="File to write the program to")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--label-density", type=float, default=0.02, help="Chance of a label before each instruction")
+    parser.add_argument("--mem-ratio", type=float, default=0.1, help="Share of ld/st instructions")
+    parser.add_argument("--branch-ratio", type=float, default=0.1, help="Share of b/beq/bgt/call instructions")
+    parser.add_argument("--modifier-ratio", type=float, default=0.2, help="Share of ALU instructions with a u/h modifier")
+    parser.add_argument("--org", type=lambda value: int(value, 0), help="Origin address (.org), e.g. 0x1000")
+
+    args = parser.parse_args()
+    with open(args.output, "w") as f:
+        f.write(generate_program(args.size, args.seed, args.label_density, args.mem_ratio,
+                                 args.modifier_ratio, args.branch_ratio, args.org))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import isa
+from assemble import assemble_source
+from unassemble import Disassembler, np
+from generate import generate_program
+
+branch_mnemonics = isa.branch_mnemonics
+
+# Reference decoder for the listing check: the original string-slicing disassembler, with its
+# own opcode table, so it shares no code with unassemble.py or isa.py
+reference_opcodes = {
+    "00000": "add", "00001": "sub", "00010": "mul", "00011": "div", "00100": "mod", "00101": "cmp",
+    "00110": "and", "00111": "or", "01000": "not", "01001": "mov", "01010": "lsl", "01011": "lsr",
+    "01100": "asr", "01101": "nop", "01110": "ld", "01111": "st",
+    "10000": "beq", "10001": "bgt", "10010": "b", "10011": "call", "10100": "ret", "11111": "hlt"
+}
+
+
+def signed(bits):
+    return int(bits, 2) - (1 << len(bits) if bits[0] == "1" else 0)
+
+
+def reference_text(word, address):
+    bits = f"{word:032b}"
+    mnemonic = reference_opcodes.get(bits[:5])
+    if mnemonic is None:
+        return "UNKNOWN"
+    if mnemonic in ("nop", "ret", "hlt"):
+        return mnemonic
+    imm_flag, mod = bits[5] == "1", bits[14:16]
+    rd, rs1, rs2 = f"r{int(bits[6:10], 2)}", f"r{int(bits[10:14], 2)}", f"r{int(bits[14:18], 2)}"
+    if mnemonic in ("b", "beq", "bgt", "call"):
+        return f"{mnemonic} 0x{address + 4 * signed(bits[5:]):X}"
+    if mnemonic in ("not", "mov"):
+        return f"{mnemonic} {rd}, {signed(bits[16:]) if imm_flag else rs2}"
+    if mnemonic == "cmp":
+        return f"{mnemonic} {rs1}, {signed(bits[16:]) if imm_flag else rs2}"
+    if mnemonic in ("ld", "st"):
+        return f"{mnemonic} {rd}, {signed(bits[16:])}[{rs1}]"
+    if not imm_flag:
+        return f"{mnemonic} {rd}, {rs1}, {rs2}"
+    modifier = {"01": "u", "10": "h"}.get(mod, "")
+    return f"{mnemonic}{modifier} {rd}, {rs1}, {int(bits[16:], 2) if mod == '01' else signed(bits[16:])}"
+
+
+def reference_listing(words, address):
+    return [reference_text(word, address + 4 * index) for index, word in enumerate(words)]
+
+
+def listing(disassembler, words, address):
+    # Assembly text of each word ("mov r1, 5")
+    return [record.text() for record in disassembler.decode_words(words, address)]
+
+
+def to_source(texts, address):
+    # Disassembled text back into a program at address. Branch targets (absolute addresses)
+    # become labels, put before the instruction at that address or in an empty section.
+    # Returns the source and, per line number, the index of the word it came from.
+    targets = {int(text.split()[1], 16) for text in texts if text.split(" ", 1)[0] in branch_mnemonics}
+    lines = [f".org 0x{address:X}:"]
+    indexes = {}
+    for index, text in enumerate(texts):
+        here = address + 4 * index
+        if here in targets:
+            lines.append(f".t{here:X}:")
+            targets.discard(here)
+        mnemonic = text.split(" ", 1)[0]
+        lines.append(f"{mnemonic} .t{int(text.split()[1], 16):X}" if mnemonic in branch_mnemonics else text)
+        indexes[len(lines)] = index
+    for target in sorted(targets):
+        lines.append(f".org 0x{target:X}:\n.t{target:X}:")
+    return "\n".join(lines) + "\n", indexes
+
+
+def round_trip(source, disassembler, reference=False):
+    # Assembles source, disassembles the words, reassembles that listing and compares.
+    # Returns (words, address, texts, reassembled words, mismatching indexes, timings); with
+    # reference, words whose line differs from reference_listing's also count.
+    started = time.perf_counter()
+    assembler = assemble_source(source, "<fuzz>")
+    assembled = time.perf_counter()
+    if assembler.errors:
+        raise ValueError(f"generated program does not assemble: {assembler.errors[:3]}")
+    image = assembler.segments.flatten()
+    words, address = image.words(), image.start_address
+    texts = listing(disassembler, words, address)
+    disassembled = time.perf_counter()
+    listing_source, indexes = to_source(texts, address)
+    again = assemble_source(listing_source, "<roundtrip>")
+    reassembled = time.perf_counter()
+    result = again.segments.flatten().words() if not again.errors else array("I")
+
+    # a listing that does not assemble fails at its bad lines only
+    bad = {indexes[lineno] for lineno, _ in again.errors if lineno in indexes}
+    if not again.errors or not bad:
+        bad.update(index for index, word in enumerate(words) if index >= len(result) or result[index] != word)
+    if reference:
+        bad.update(index for index, (ours, theirs) in enumerate(zip(texts, reference_listing(words, address))) if ours != theirs)
+    timings = {"assemble": assembled - started, "disassemble": disassembled - assembled, "reassemble": reassembled - disassembled}
+    return words, address, texts, result, sorted(bad), timings
+
+
+def minimize(line, word, address, disassembler, reference=False):
+    # The smallest program showing the failure: the one instruction, plus the branch target
+    # as a label in a section of its own. Returns that program, or None when the instruction
+    # only fails in the context of its original program.
+    if word >> 27 in Disassembler.branch_opcodes:
+        target = address + 4 * ((word & 0x7FFFFFF) - ((word & 0x4000000) << 1))
+        mnemonic = line.split()[0]
+        source = f".org 0x{address:X}:\n.x:\n{mnemonic} .x\n" if target == address else \
+            f".org 0x{address:X}:\n{mnemonic} .x\n.org 0x{target:X}:\n.x:\n"
+    else:
+        source = f".org 0x{address:X}:\n{line}\n"
+    try:
+        bad = round_trip(source, disassembler, reference)[4]
+    except ValueError:
+        return None
+    return source if bad else None
+
+
+def run_case(seed, size, org, reference, max_failures):
+    # Worker: one generated program of size instructions. Returns (instructions, timings,
+    # failures), a failure being a dict with the original line, the words and the listing.
+    disassembler = Disassembler("<fuzz>")
+    source = generate_program(size, seed, origin=org)
+    lines = source.split("\n")
+    words, address, texts, result, bad, timings = round_trip(source, disassembler, reference)
+    failures = []
+    if bad:
+        assembler = assemble_source(source, "<fuzz>")
+        line_of = {token_address: lineno for token_address, _, _, lineno in assembler.tokenized_instructions}
+        for index in bad[:max_failures]:
+            here = address + 4 * index
+            line = lines[line_of[here] - 1].strip()
+            failures.append({
+                "seed": seed, "address": here, "source": line, "word": words[index], "disassembled": texts[index],
+                "reference": reference_text(words[index], here) if reference else None,
+                "reassembled": result[index] if index < len(result) else None,
+                "minimal": minimize(line, words[index], here, disassembler, reference),
+            })
+    return len(words), timings, failures, len(bad)
+
+
+def kind(failure):
+    # Failures are grouped by mnemonic and operand form
+    word = failure["word"]
+    form = "imm" if word >> 26 & 1 else "reg"
+    return f"{Disassembler.opcode_names.get(word >> 27, 'unknown')} {form}" + (f" mod {word >> 16 & 3}" if form == "imm" else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-trip fuzzing: assemble random programs, disassemble, reassemble and compare the words")
+    parser.add_argument("-n", "--instructions", type=int, default=1_000_000, help="Total number of random instructions")
+    parser.add_argument("-c", "--case-size", type=int, default=20_000, help="Instructions per generated program")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first program; program k uses seed + k")
+    parser.add_argument("--org", type=lambda value: int(value, 0), default=0x1000, help="Origin address of the generated programs")
+    parser.add_argument("--no-reference", action="store_true", help="Do not compare the listing with the reference string-slicing decoder")
+    parser.add_argument("--examples", type=int, default=10, help="Failing cases kept per program and printed per kind")
+    parser.add_argument("-o", "--output", help="JSON file for the throughput and failures")
+    parser.add_argument("-b", "--baseline", help="JSON from an earlier run; a throughput drop beyond --tolerance fails the run")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Slowdown versus the baseline that counts as a regression")
+
+    args = parser.parse_args()
+    reference = not args.no_reference
+    cases = [(args.seed + k, min(args.case_size, args.instructions - start))
+             for k, start in enumerate(range(0, args.instructions, args.case_size))]
+    total = 0
+    mismatches = 0
+    timings = {"assemble": 0.0, "disassemble": 0.0, "reassemble": 0.0}
+    groups = {}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(run_case, seed, size, args.org, reference, args.examples) for seed, size in cases]
+        for future in futures:
+            count, case_timings, failures, bad = future.result()
+            total += count
+            mismatches += bad
+            for phase, seconds in case_timings.items():
+                timings[phase] += seconds
+            for failure in failures:
+                groups.setdefault(kind(failure), []).append(failure)
+    elapsed = time.perf_counter() - started
+
+    # per-tool rates are single-core (time summed over the workers), the overall one is wall time
+    rates = {phase: total / seconds if seconds else None for phase, seconds in timings.items()}
+    print(f"{total} instructions in {len(cases)} programs, {elapsed:.2f} s ({total / elapsed:.0f} instructions/sec round trip)")
+    for phase, rate in rates.items():
+        print(f"{phase:<12} {timings[phase]:>9.3f} s  ({rate:.0f} instructions/sec)")
+    if mismatches:
+        print(f"{mismatches} instructions failed the round trip ({len(groups)} kinds)")
+        for name, failures in sorted(groups.items(), key=lambda item: -len(item[1])):
+            failure = next((f for f in failures if f["minimal"]), failures[0])
+            reassembled = "error" if failure["reassembled"] is None else f"{failure['reassembled']:032b}"
+            print(f"  [{name}] e.g. seed {failure['seed']} at 0x{failure['address']:X}: {failure['source']}")
+            print(f"      word         {failure['word']:032b}")
+            print(f"      disassembled {failure['disassembled']}" + (f"  (reference: {failure['reference']})" if failure["reference"] not in (None, failure["disassembled"]) else ""))
+            print(f"      reassembled  {reassembled}")
+            if failure["minimal"]:
+                print("      minimal case: " + failure["minimal"].strip().replace("\n", " | "))
+    else:
+        print("No round-trip failures")
+
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "numpy": np.__version__ if np is not None else None,
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "seed": args.seed, "case_size": args.case_size, "reference": reference},
+        "instructions": total, "seconds": elapsed, "rates": rates, "mismatches": mismatches,
+        "failures": {name: failures[:args.examples] for name, failures in groups.items()},
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["rates"]
+        for phase, rate in rates.items():
+            before = baseline.get(phase)
+            if before and rate and rate < before / (1 + args.tolerance):
+                regressions += 1
+                print(f"{phase}: {rate:.0f} instructions/sec versus {before:.0f} in the baseline  REGRESSION")
+    if mismatches or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
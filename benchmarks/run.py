@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assemble import Assembler
+from unassemble import Disassembler, np
+from generate import generate_program
+
+
+def best_of(repeat, setup, run):
+    # Best wall time of `repeat` runs; setup() builds fresh state outside the timed region.
+    best = None
+    for _ in range(repeat):
+        state = setup()
+        started = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_size(size, args, workdir, devnull):
+    source = os.path.join(workdir, f"bench_{size}.s")
+    with open(source, "w") as f:
+        f.write(generate_program(size, args.seed, args.label_density, args.mem_ratio, args.modifier_ratio, args.branch_ratio, args.org))
+    repeat = args.repeat if size < 1_000_000 else 1
+    timings = {}
+
+    # parse_data lexes, encodes and backpatches branches in one pass, so it covers the old
+    # tokenize_instructions, update_addresses and encode_tokens steps
+    timings["parse_data"] = best_of(repeat, lambda: Assembler(source), lambda a: a.parse_data())
+    assembler = Assembler(source)
+    assembler.parse_data()
+    for fmt in Assembler.output_formats:
+        target = os.path.join(workdir, f"bench_{size}{Assembler.output_formats[fmt][2]}")
+        timings[f"write_{fmt}"] = best_of(repeat, lambda: assembler, lambda a: a.write_outputs({fmt: target}, file=devnull))
+
+    bintxt = os.path.join(workdir, f"bench_{size}_bin.txt")
+    listing = os.path.join(workdir, f"bench_{size}.dis")
+
+    def disassembled():
+        disassembler = Disassembler(bintxt)
+        disassembler.disassemble()
+        return disassembler
+
+    timings["disassemble"] = best_of(repeat, lambda: Disassembler(bintxt), lambda d: d.disassemble())
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        timings["save_to_file"] = best_of(repeat, disassembled, lambda d: d.save_to_file(listing, True))
+    finally:
+        sys.stdout = stdout
+    return [{"size": size, "phase": phase, "seconds": seconds, "instructions_per_sec": size / seconds if seconds else None}
+            for phase, seconds in timings.items()]
+
+
+def compare(results, baseline, tolerance):
+    # Prints current vs baseline per (size, phase); returns the number of regressions.
+    reference = {(entry["size"], entry["phase"]): entry["seconds"] for entry in baseline["results"]}
+    regressions = 0
+    print(f"{'size':>10} {'phase':<18} {'baseline s':>11} {'current s':>11} {'ratio':>7}")
+    for entry in results:
+        before = reference.get((entry["size"], entry["phase"]))
+        if before is None:
+            continue
+        ratio = entry["seconds"] / before if before else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{entry['size']:>10} {entry['phase']:<18} {before:>11.4f} {entry['seconds']:>11.4f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SimpleRisc assembler and disassembler phase by phase")
+    parser.add_argument("-n", "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Program sizes in instructions (e.g. 1000 ... 10000000)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Runs per phase; the best time is kept (1 run from 1M instructions up)")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON file for the results")
+    parser.add_argument("-b", "--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Slowdown versus the baseline that counts as a regression")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed")
+    parser.add_argument("--label-density", type=float, default=0.02, help="Chance of a label before each instruction")
+    parser.add_argument("--mem-ratio", type=float, default=0.1, help="Share of ld/st instructions")
+    parser.add_argument("--branch-ratio", type=float, default=0.1, help="Share of branch instructions")
+    parser.add_argument("--modifier-ratio", type=float, default=0.2, help="Share of ALU instructions with a u/h modifier")
+    parser.add_argument("--org", type=lambda value: int(value, 0), default=0x1000, help="Origin address of the generated programs")
+
+    args = parser.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, "w") as devnull:
+        for size in args.sizes:
+            for entry in bench_size(size, args, workdir, devnull):
+                results.append(entry)
+                print(f"{size:>10} {entry['phase']:<18} {entry['seconds']:.4f} s  ({entry['instructions_per_sec']:.0f} instr/s)")
+
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "numpy": np.__version__ if np is not None else None,
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "seed": args.seed, "repeat": args.repeat},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{regressions} phase(s) slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# The SimpleRisc instruction set, shared by the assembler, the disassembler and the simulator.
+# Every lookup table the tools use is derived from `instructions` once, at import time.
+#
+# Word layout: opcode[31:27] imm[26] rd[25:22] rs1[21:18] (rs2[17:14] | mod[17:16] imm16[15:0]),
+# and for branches opcode[31:27] offset[26:0], counted in words from the branch itself.
+# Formats, with their operands as written in assembly:
+#   zero    nop                 branch  b .label
+#   two     mov rd, rs2|imm     cmp     cmp rs1, rs2|imm
+#   three   add rd, rs1, rs2|imm (the only format taking the u/h modifiers)
+#   mem     ld rd, imm[rs1]
+
+# mnemonic -> (opcode, format)
+instructions = {
+    "add": (0b00000, "three"), "sub": (0b00001, "three"), "mul": (0b00010, "three"), "div": (0b00011, "three"),
+    "mod": (0b00100, "three"), "cmp": (0b00101, "cmp"), "and": (0b00110, "three"), "or": (0b00111, "three"),
+    "not": (0b01000, "two"), "mov": (0b01001, "two"), "lsl": (0b01010, "three"), "lsr": (0b01011, "three"),
+    "asr": (0b01100, "three"), "nop": (0b01101, "zero"), "ld": (0b01110, "mem"), "st": (0b01111, "mem"),
+    "beq": (0b10000, "branch"), "bgt": (0b10001, "branch"), "b": (0b10010, "branch"), "call": (0b10011, "branch"),
+    "ret": (0b10100, "zero"), "hlt": (0b11111, "zero"),
+}
+
+# operands each format takes after the mnemonic (mem: rd, imm and rs1)
+format_operands = {"zero": 0, "branch": 1, "two": 2, "cmp": 2, "three": 3, "mem": 3}
+
+# modifier suffix -> value of the mod field
+modifiers = {"": 0, "u": 1, "h": 2}
+
+opcode_values = {mnemonic: opcode for mnemonic, (opcode, _) in instructions.items()}
+opcode_names = {opcode: mnemonic for mnemonic, opcode in opcode_values.items()}
+formats = {mnemonic: fmt for mnemonic, (_, fmt) in instructions.items()}
+operand_counts = {mnemonic: format_operands[fmt] for mnemonic, fmt in formats.items()}
+modifiable = frozenset(mnemonic for mnemonic, fmt in formats.items() if fmt == "three")
+branch_opcodes = frozenset(opcode_values[mnemonic] for mnemonic, fmt in formats.items() if fmt == "branch")
+branch_mnemonics = frozenset(mnemonic for mnemonic, fmt in formats.items() if fmt == "branch")
+
+# mnemonic as written -> (base mnemonic, modifier bits)
+mnemonics = {mnemonic + suffix: (mnemonic, f"{value:02b}") for suffix, value in modifiers.items()
+             for mnemonic in (modifiable if suffix else formats)}
+
+# Register number tuples for the decoders below, indexed by the numbers as hex digits: shared
+# instead of built for every decoded word, so templates stay cheap to create and to collect
+one_register = tuple((a,) for a in range(16))
+two_registers = tuple((a, b) for a in range(16) for b in range(16))
+three_registers = tuple((a, b, c) for a in range(16) for b in range(16) for c in range(16))
+
+# Decoders: the fields of one word (see unassemble.Disassembler.decode_fields) ->
+# (mnemonic, registers, immediate, assembly text), see unassemble.Instruction. registers are
+# the numbers of the registers written, in order. For a branch the immediate is its offset in
+# words and the text stops after "mnemonic ", since the target depends on the address. Each is
+# built for one mnemonic, so decoding a word is a table lookup and one call.
+def decode_unknown(imm_flag, rd, rs1, mod, rs2, uimm, simm, offset):
+    return None, (), None, "UNKNOWN"
+
+
+def zero_decoder(mnemonic):
+    def decode(imm_flag, rd, rs1, mod, rs2, uimm, simm, offset):
+        return mnemonic, (), None, mnemonic
+    return decode
+
+
+def branch_decoder(mnemonic):
+    prefix = mnemonic + " "
+
+    def decode(imm_flag, rd, rs1, mod, rs2, uimm, simm, offset):
+        return mnemonic, (), offset, prefix
+    return decode
+
+
+def two_decoder(mnemonic):
+    def decode(imm_flag, rd, rs1, mod, rs2, uimm, simm, offset):
+        if imm_flag:
+            return mnemonic, one_register[rd], simm, f"{mnemonic} r{rd}, {simm}"
+        return mnemonic, two_registers[rd << 4 | rs2], None, f"{mnemonic} r{rd}, r{rs2}"
+    return decode
+
+
+def cmp_decoder(mnemonic):
+    def decode(imm_flag, rd, rs1, mod, rs2, uimm, simm, offset):
+        if imm_flag:
+            return mnemonic, one_register[rs1], simm, f"{mnemonic} r{rs1}, {simm}"
+        return mnemonic, two_registers[rs1 << 4 | rs2], None, f"{mnemonic} r{rs1}, r{rs2}"
+    return decode
+
+
+def three_decoder(mnemonic):
+    # written mnemonic per mod field value (3 is not assigned and decodes as plain)
+    written = tuple(mnemonic + suffix for suffix in ("", "u", "h", ""))
+
+    def decode(imm_flag, rd, rs1, mod, rs2, uimm, simm, offset):
+        if imm_flag:
+            imm = uimm if mod == 1 else simm
+            return written[mod], two_registers[rd << 4 | rs1], imm, f"{written[mod]} r{rd}, r{rs1}, {imm}"
+        return mnemonic, three_registers[rd << 8 | rs1 << 4 | rs2], None, f"{mnemonic} r{rd}, r{rs1}, r{rs2}"
+    return decode
+
+
+def mem_decoder(mnemonic):
+    def decode(imm_flag, rd, rs1, mod, rs2, uimm, simm, offset):
+        return mnemonic, two_registers[rd << 4 | rs1], simm, f"{mnemonic} r{rd}, {simm}[r{rs1}]"
+    return decode
+
+
+decoder_builders = {"zero": zero_decoder, "branch": branch_decoder, "two": two_decoder, "cmp": cmp_decoder,
+                    "three": three_decoder, "mem": mem_decoder}
+
+# opcode -> (mnemonic, format), None for the unassigned ones
+decode_table = tuple((opcode_names[opcode], formats[opcode_names[opcode]]) if opcode in opcode_names else None
+                     for opcode in range(32))
+
+# opcode -> decoder of that instruction
+decoders = tuple(decode_unknown if entry is None else decoder_builders[entry[1]](entry[0]) for entry in decode_table)
@@ -0,0 +1,270 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from assemble import Assembler, Image, SegmentMap, add_output_arguments, expand_paths, output_paths
+from preprocess import Preprocessor
+from stats import Stats, timed
+
+
+class ObjectFile:
+    # One source file assembled on its own. sections are (origin, words) in source order, the
+    # origin being None for the code ahead of the first .org, which the linker places. symbols
+    # maps every label to (section index, offset), or (None, address) for a label outside any
+    # section. relocations are (section index, word index, label, line, file) for the branches
+    # the assembler could not resolve alone: to labels in another section or another file; file
+    # is the included file holding the branch, or None. source_mtime and digest (sha256 of the
+    # source), plus the (path, mtime) of every included file, tell whether the object is current.
+    version = 2
+
+    def __init__(self, source, source_mtime, digest, sections, symbols, relocations, includes=()):
+        self.source = source
+        self.source_mtime = source_mtime
+        self.digest = digest
+        self.sections = sections
+        self.symbols = symbols
+        self.relocations = relocations
+        self.includes = list(includes)
+
+    def includes_current(self):
+        try:
+            return all(os.stat(path).st_mtime_ns == mtime for path, mtime in self.includes)
+        except OSError:
+            return False
+
+    @classmethod
+    def assemble(cls, path, data, source_mtime):
+        # Returns (object, errors), errors being (file, line, message)
+        assembler = Assembler(path, data.decode())
+        assembler.relocatable = True
+        assembler.parse_data()
+        index = {id(words): i for i, (_, _, words, _) in enumerate(assembler.sections)}
+        sections = [(None if lineno is None else base, words) for base, _, words, lineno in assembler.sections]
+        symbols = {}
+        for label, address in assembler.labels.items():
+            section = index.get(id(assembler.label_sections[label]))
+            symbols[label] = (None, address) if section is None else (section, address - assembler.sections[section][0])
+        relocations = [(index[id(words)], word_index, label) + Preprocessor.location(lineno)[::-1]
+                       for words, word_index, label, lineno in assembler.relocations]
+        errors = []
+        for lineno, message in assembler.errors:
+            included, line = Preprocessor.location(lineno)
+            errors.append((included or path, line, message))
+        digest = hashlib.sha256(data).hexdigest()
+        includes = sorted(set(assembler.includes))
+        return cls(path, source_mtime, digest, sections, symbols, relocations, includes), errors
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") != cls.version:
+            raise ValueError(f"Unsupported object file version {data.get('version')}")
+        sections = []
+        for origin, words in data["sections"]:
+            image = Image(origin or 0)
+            image.extend(bytes.fromhex(words))
+            sections.append((origin, image.words()))
+        symbols = {label: tuple(entry) for label, entry in data["symbols"].items()}
+        relocations = [tuple(entry) for entry in data["relocations"]]
+        includes = [tuple(entry) for entry in data["includes"]]
+        return cls(data["source"], data["source_mtime"], data["digest"], sections, symbols, relocations, includes)
+
+    def save(self, path):
+        data = {
+            "version": self.version, "source": self.source, "source_mtime": self.source_mtime, "digest": self.digest,
+            "sections": [(origin, Image(0, words).hex()) for origin, words in self.sections],
+            "symbols": self.symbols, "relocations": self.relocations, "includes": self.includes,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+
+class Linker(Assembler):
+    # Builds one program out of several source files. Every source is assembled into an object
+    # file (.o, next to it or in objdir) which is reused as long as the source is unchanged
+    # (same mtime, or else same content hash) and so are the files it includes. Objects already
+    # loaded stay cached in memory between builds. Linking places the sections in file order:
+    # one with an origin at that address, one without right after the previous section. A
+    # relocation resolves to the object's own label first, then to the single other object
+    # defining it. The result (segments, labels, errors as (path, line, message)) is written
+    # like an Assembler's.
+    def __init__(self, paths, objdir=None, base=0x0000, stats=None):
+        super().__init__(paths[0] if paths else "<link>", stats=stats)
+        self.paths = paths
+        self.objdir = objdir
+        self.base = base
+        self.cache = {}
+        self.objects = []
+        self.assembled = 0
+        self.reused = 0
+
+    def object_path(self, path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.objdir if self.objdir is not None else os.path.dirname(path), stem + ".o")
+
+    def load_object(self, path, force=False):
+        # The object for one input: a .o is taken as it is, a source reuses its object if it is
+        # current and is assembled (and its object written) otherwise. None on errors.
+        if path.endswith(".o"):
+            try:
+                return ObjectFile.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                self.errors.append((path, 0, f"Cannot load object: {e}"))
+                return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.errors.append((path, 0, "File not found"))
+            return None
+        target = self.object_path(path)
+        obj = None if force else self.cache.get(path)
+        if obj is None and not force:
+            try:
+                obj = ObjectFile.load(target)
+            except (OSError, ValueError, KeyError):
+                obj = None
+        if obj is not None and not obj.includes_current():
+            obj = None
+        if obj is not None and obj.source_mtime == mtime:
+            self.reused += 1
+            self.cache[path] = obj
+            return obj
+        with open(path, "rb") as f:
+            data = f.read()
+        if obj is not None and obj.digest == hashlib.sha256(data).hexdigest():
+            # touched but not changed
+            obj.source_mtime = mtime
+            obj.save(target)
+            self.reused += 1
+            self.cache[path] = obj
+            return obj
+        obj, errors = ObjectFile.assemble(path, data, mtime)
+        self.assembled += 1
+        if errors:
+            self.errors.extend(errors)
+            self.cache.pop(path, None)
+            return None
+        obj.save(target)
+        self.cache[path] = obj
+        return obj
+
+    @timed("load")
+    def load_objects(self, force=False):
+        self.errors = []
+        self.assembled = self.reused = 0
+        self.objects = [self.load_object(path, force) for path in self.paths]
+        targets = [self.object_path(path) for path in self.paths if not path.endswith(".o")]
+        if len(set(targets)) != len(targets):
+            self.errors.append(("<link>", 0, "Several sources map to the same object file; use distinct file names"))
+
+    @timed("link")
+    def link(self):
+        location = self.base
+        addresses = []
+        definitions = {}
+        for obj in self.objects:
+            placed = []
+            for origin, words in obj.sections:
+                address = location if origin is None else origin
+                placed.append(address)
+                location = address + len(words) * 4
+            addresses.append(placed)
+            for label, (section, offset) in obj.symbols.items():
+                definitions.setdefault(label, []).append((obj.source, offset if section is None else placed[section] + offset))
+
+        segments = []
+        owners = []
+        for obj, placed in zip(self.objects, addresses):
+            sections = [words[:] for _, words in obj.sections]
+            for section, index, label, lineno, included in obj.relocations:
+                where = included or obj.source
+                if label in obj.symbols:
+                    own, offset = obj.symbols[label]
+                    target = offset if own is None else placed[own] + offset
+                else:
+                    found = definitions.get(label, [])
+                    if len(found) != 1:
+                        problem = f"Undefined label '{label}'" if not found else \
+                            f"Label '{label}' is defined in several files: {', '.join(source for source, _ in found)}"
+                        self.errors.append((where, lineno, problem))
+                        continue
+                    target = found[0][1]
+                try:
+                    sections[section][index] |= self.int_27b_field(target - (placed[section] + index * 4))
+                except ValueError as e:
+                    self.errors.append((where, lineno, str(e)))
+            for address, words in zip(placed, sections):
+                segments.append(Image(address, words))
+                owners.append(obj.source)
+            if self.stats is not None:
+                self.stats.count("relocations", len(obj.relocations))
+
+        layout = sorted(zip(((segment.start_address, segment.start_address + len(segment)) for segment in segments), owners))
+        for ((_, end), _), ((start, _), source) in zip(layout, layout[1:]):
+            if start < end:
+                self.errors.append((source, 0, f"Section at 0x{start:X} overlaps another one ending at 0x{end:X}"))
+        # an object's own labels win over those of later objects, like for relocations
+        self.labels = {label: found[0][1] for label, found in definitions.items()}
+        self.start_address = segments[0].start_address if segments else self.base
+        self.layout = [(segment.start_address, segment.start_address + len(segment)) for segment in segments]
+        self.segments = SegmentMap(segments, self.entry_point())
+        if self.stats is not None:
+            self.stats.count("objects_assembled", self.assembled)
+            self.stats.count("objects_reused", self.reused)
+            for segment in self.segments:
+                self.count_words(segment.words())
+
+    def build(self, force=False):
+        # Loads or assembles every object, then links; returns True without errors
+        self.load_objects(force)
+        if self.errors:
+            return False
+        self.link()
+        return not self.errors
+
+    def print_errors(self, file=None):
+        for path, lineno, message in sorted(set(self.errors)):
+            where = f"{path}: line {lineno}" if lineno else path
+            print(f"Error: {where}: {message}", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleRisc Linker: assemble sources into reusable objects and link them into one program")
+    parser.add_argument("-f", "--file", required=True, nargs="+", help="Source or .o files (or glob patterns), in link order")
+    parser.add_argument("-o", "--objdir", help="Directory for the object files (default: next to each source)")
+    parser.add_argument("-a", "--base", type=lambda value: int(value, 0), default=0x0000, help="Address of the first section without a .org")
+    parser.add_argument("--force", action="store_true", help="Reassemble every source even if its object is current")
+    parser.add_argument("-e", "--encode", action="store_true", help="Print the linked instructions")
+    add_output_arguments(parser)
+    parser.add_argument("--stats", action="store_true", help="Print per-phase timings and counters to stderr")
+
+    args = parser.parse_args()
+    outputs = output_paths(parser, args)
+    status = sys.stderr if "-" in outputs.values() else None
+    stats = Stats() if args.stats else None
+    if args.objdir is not None:
+        os.makedirs(args.objdir, exist_ok=True)
+
+    linker = Linker(expand_paths(args.file), args.objdir, args.base, stats)
+    started = time.perf_counter()
+    ok = linker.build(args.force)
+    elapsed = (time.perf_counter() - started) * 1000
+    if ok:
+        if args.encode:
+            linker.print_encoded()
+        if outputs:
+            linker.write_outputs(outputs, file=status)
+        print(f"Linked {len(linker.objects)} objects ({linker.assembled} assembled, {linker.reused} reused), "
+              f"{sum(map(len, linker.segments)) // 4} instructions in {elapsed:.1f} ms", file=status)
+    if stats is not None:
+        stats.report(sys.stderr)
+    if not ok:
+        linker.print_errors()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
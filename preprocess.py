@@ -0,0 +1,229 @@
+import os
+import re
+import threading
+
+
+class Preprocessor:
+    # Expands .include, .macro/.endm and .equ ahead of Assembler.parse_data, which gets the
+    # lexed records. Line numbers keep pointing at the original text: a line of an included
+    # file is numbered (file id << 32) + its line, the id indexing Preprocessor.files (0 is the
+    # file being assembled), and every line a macro expands to carries the line of the call.
+    # A chunk without directives or macro calls is lexed as it is.
+    # Included files are memoized by path, mtime and the definitions in effect, and repeated
+    # macro expansions by name, arguments and definitions. Both keep the lexed records, so
+    # shared code is read and lexed once per process. The file registry and both caches are
+    # shared by every instance, so they are only touched under lock (server.py runs one
+    # assembler per thread). Entries are produced outside it: two threads may both make one.
+    directive_pattern = re.compile(r"^[ \t]*\.(?:include|macro|endm|equ)\b", re.M)
+    head_pattern = re.compile(r"[ \t]*([^\s;,]*)[ \t,]*([^;\n]*)")
+    directives = {".include", ".macro", ".endm", ".equ"}
+    max_depth = 64
+
+    files = [None]
+    file_ids = {}
+    include_cache = {}
+    expansion_cache = {}
+    cache_size = 4096
+    lock = threading.Lock()
+
+    def __init__(self, assembler):
+        self.assembler = assembler
+        self.equs = {}
+        self.macros = {}
+        self.equ_pattern = None
+        self.macro_pattern = None
+        # (name, parameters, body lines, line) while inside .macro
+        self.defining = None
+        self.stack = []
+        # (path, mtime) of every file included so far
+        self.included = []
+        self.expansions = 0
+
+    @classmethod
+    def location(cls, lineno):
+        # (included file or None for the assembled one, line in that file)
+        return cls.files[lineno >> 32], lineno & 0xFFFFFFFF
+
+    @classmethod
+    def where(cls, lineno):
+        path, line = cls.location(lineno)
+        return f"line {line}" if path is None else f"{path}: line {line}"
+
+    @classmethod
+    def file_id(cls, path):
+        with cls.lock:
+            if path not in cls.file_ids:
+                cls.file_ids[path] = len(cls.files)
+                cls.files.append(path)
+            return cls.file_ids[path]
+
+    def update_patterns(self):
+        # names defined with .equ are replaced as whole words, never as part of a .label
+        names = "|".join(map(re.escape, sorted(self.equs, key=len, reverse=True)))
+        self.equ_pattern = re.compile(rf"(?<![\w.])({names})\b") if names else None
+        names = "|".join(map(re.escape, sorted(self.macros, key=len, reverse=True)))
+        self.macro_pattern = re.compile(rf"^[ \t]*(?:{names})(?![^\s;,])", re.M) if names else None
+
+    def substitute(self, text):
+        if self.equ_pattern is None:
+            return text
+        return self.equ_pattern.sub(lambda match: self.equs[match.group(1)], text)
+
+    def state(self):
+        return tuple(sorted(self.equs.items())), tuple(sorted(self.macros.items()))
+
+    def count(self, name):
+        if self.assembler.stats is not None:
+            self.assembler.stats.count(name)
+
+    def run(self, chunks, path):
+        # chunks: (first line number, text) of the file at path, as Assembler.read_chunks gives
+        self.stack = [os.path.normpath(path)]
+        return self.expand_file(chunks, 0, os.path.dirname(path), 0)
+
+    def expand_file(self, chunks, file_id, directory, depth):
+        yield from self.expand(chunks, file_id, directory, depth)
+        if self.defining is not None and self.defining[3] >> 32 == file_id:
+            self.assembler.errors.append((self.defining[3], f"'.macro {self.defining[0]}' without '.endm'"))
+            self.defining = None
+
+    def expand(self, chunks, file_id, directory, depth):
+        lex = self.assembler.lex
+        base = file_id << 32
+        for first_lineno, text in chunks:
+            if not (self.defining or self.directive_pattern.search(text) or self.macro_pattern and self.macro_pattern.search(text)):
+                yield from lex(self.substitute(text), base + first_lineno)
+                continue
+            # plain lines are gathered into runs and lexed together
+            run = []
+            run_start = first_lineno
+            for lineno, line in enumerate(text.splitlines(True), first_lineno):
+                head, rest = self.head_pattern.match(line).groups()
+                if self.defining is None and head not in self.directives and head not in self.macros:
+                    if not run:
+                        run_start = lineno
+                    run.append(line)
+                    continue
+                if run:
+                    yield from lex(self.substitute("".join(run)), base + run_start)
+                    run = []
+                yield from self.directive(head, rest.strip(), line, base + lineno, directory, depth)
+            if run:
+                yield from lex(self.substitute("".join(run)), base + run_start)
+
+    def directive(self, head, rest, line, lineno, directory, depth):
+        errors = self.assembler.errors
+        if self.defining is not None:
+            if head == ".endm":
+                name, params, body, _ = self.defining
+                self.macros[name] = (params, "".join(body))
+                self.defining = None
+                self.update_patterns()
+            elif head == ".macro":
+                errors.append((lineno, "Nested '.macro' definitions are not supported"))
+            else:
+                self.defining[2].append(line if line.endswith("\n") else line + "\n")
+        elif head == ".equ":
+            parts = re.split(r"[\s,]+", rest, 1)
+            if len(parts) != 2 or not parts[0].isidentifier() or not parts[1]:
+                errors.append((lineno, "'.equ' expects a name and a value"))
+            else:
+                self.equs[parts[0]] = self.substitute(parts[1])
+                self.update_patterns()
+        elif head == ".macro":
+            parts = re.split(r"[\s,]+", rest) if rest else []
+            if not parts or not parts[0].isidentifier() or parts[0] in self.assembler.mnemonics:
+                errors.append((lineno, f"Invalid macro name '{parts[0] if parts else ''}'"))
+                parts = ["?"] + parts[1:]
+            self.defining = (parts[0], tuple(parts[1:]), [], lineno)
+        elif head == ".endm":
+            errors.append((lineno, "'.endm' without '.macro'"))
+        elif head == ".include":
+            yield from self.include(rest, lineno, directory, depth)
+        else:
+            yield from self.invoke(head, rest, lineno, directory, depth)
+
+    def cached(self, cache, key, produce):
+        # Runs produce() once per key; a hit replays the records, errors and definitions it left
+        errors = self.assembler.errors
+        with self.lock:
+            entry = cache.get(key)
+        if entry is not None and all(os.stat(path).st_mtime_ns == mtime if os.path.exists(path) else False for path, mtime in entry[2]):
+            records, added, included, equs, macros = entry
+            errors.extend(added)
+            self.included.extend(included)
+            self.equs, self.macros = dict(equs), dict(macros)
+            self.update_patterns()
+            return records, True
+        before, included = len(errors), len(self.included)
+        records = produce()
+        with self.lock:
+            if len(cache) >= self.cache_size:
+                cache.clear()
+            cache[key] = (records, errors[before:], self.included[included:], dict(self.equs), dict(self.macros))
+        return records, False
+
+    def include(self, name, lineno, directory, depth):
+        name = name.strip('"')
+        if not self.assembler.allow_include:
+            self.assembler.errors.append((lineno, "'.include' is not allowed here"))
+            return
+        path = os.path.normpath(os.path.join(directory, name))
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.assembler.errors.append((lineno, f"Cannot include '{name}': file not found"))
+            return
+        if path in self.stack or depth >= self.max_depth:
+            self.assembler.errors.append((lineno, f"Recursive '.include' of '{name}'"))
+            return
+
+        def produce():
+            with open(path, "r") as f:
+                text = f.read()
+            self.included.append((path, mtime))
+            self.stack.append(path)
+            try:
+                return list(self.expand_file([(1, text)], self.file_id(path), os.path.dirname(path), depth + 1))
+            finally:
+                self.stack.pop()
+
+        try:
+            records, hit = self.cached(self.include_cache, (path, mtime, self.state()), produce)
+        except OSError as e:
+            # a directory, an unreadable file, ...; nothing is cached for it
+            self.assembler.errors.append((lineno, f"Cannot include '{name}': {e.strerror}"))
+            return
+        except UnicodeDecodeError as e:
+            self.assembler.errors.append((lineno, f"Cannot include '{name}': not a text file ({e.reason})"))
+            return
+        self.count("include_cache_hits" if hit else "includes_read")
+        yield from records
+
+    def invoke(self, name, rest, lineno, directory, depth):
+        params, body = self.macros[name]
+        args = tuple(arg for arg in re.split(r"[\s,]+", rest) if arg)
+        if len(args) != len(params):
+            self.assembler.errors.append((lineno, f"Macro '{name}' expects {len(params)} argument(s)"))
+            return
+        if depth >= self.max_depth:
+            self.assembler.errors.append((lineno, f"Macro '{name}' nests too deeply"))
+            return
+        for param, arg in sorted(zip(params, args), key=lambda pair: -len(pair[0])):
+            body = body.replace("\\" + param, arg)
+        if "\\@" in body:
+            # a number unique to this expansion, e.g. for labels
+            self.expansions += 1
+            body = body.replace("\\@", str(self.expansions))
+
+        # lexed as line 1, 2, ... of a nameless file; every line then moves to the call
+        def produce():
+            return list(self.expand([(1, body)], 0, directory, depth + 1))
+
+        errors = self.assembler.errors
+        before = len(errors)
+        records, hit = self.cached(self.expansion_cache, (body, directory, self.assembler.allow_include, self.state()), produce)
+        errors[before:] = [(lineno, message) for _, message in errors[before:]]
+        self.count("macro_cache_hits" if hit else "macro_expansions")
+        for record in records:
+            yield (lineno,) + record[1:]
@@ -0,0 +1,238 @@
+import argparse
+import base64
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from assemble import Assembler, assemble_source
+from preprocess import Preprocessor
+from unassemble import Disassembler, Instruction
+
+
+class ResultCache:
+    # Least-recently-used cache of finished jobs, keyed by operation, source hash and options.
+    def __init__(self, size=1024):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, op, source, options):
+        digest = hashlib.sha256(source.encode()).hexdigest()
+        return op, digest, json.dumps(options, sort_keys=True)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+class Metrics:
+    # Request counts and latencies per endpoint; the last 1000 latencies give the percentiles.
+    def __init__(self):
+        self.started = time.time()
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, jobs, seconds):
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, {"requests": 0, "jobs": 0, "total_ms": 0.0, "max_ms": 0.0, "recent": deque(maxlen=1000)})
+            ms = seconds * 1000
+            stats["requests"] += 1
+            stats["jobs"] += jobs
+            stats["total_ms"] += ms
+            stats["max_ms"] = max(stats["max_ms"], ms)
+            stats["recent"].append(ms)
+
+    def snapshot(self, cache):
+        with self.lock:
+            endpoints = {}
+            for endpoint, stats in self.endpoints.items():
+                recent = sorted(stats["recent"])
+                endpoints[endpoint] = {
+                    "requests": stats["requests"],
+                    "jobs": stats["jobs"],
+                    "mean_ms": stats["total_ms"] / stats["requests"],
+                    "max_ms": stats["max_ms"],
+                    "p50_ms": recent[len(recent) // 2],
+                    "p95_ms": recent[min(len(recent) - 1, len(recent) * 95 // 100)],
+                }
+        lookups = cache.hits + cache.misses
+        return {
+            "uptime_s": time.time() - self.started,
+            "endpoints": endpoints,
+            "cache": {"size": len(cache.entries), "capacity": cache.size, "hits": cache.hits, "misses": cache.misses,
+                      "hit_rate": cache.hits / lookups if lookups else 0.0},
+        }
+
+
+def assemble_job(job):
+    # job: {"source": text, "format": "bin" | "hex" | "bintxt" | "hextxt" | "seg" | "ihex" | "srec" | "tokens" | "encoded"}
+    fmt = job.get("format", "hex")
+    if fmt not in Assembler.output_formats and fmt not in ("tokens", "encoded"):
+        raise ValueError(f"Unknown format '{fmt}'")
+    # sources come from any client, so they may not read files through .include
+    assembler = assemble_source(job["source"], allow_include=False)
+    if assembler.errors:
+        errors = []
+        for lineno, message in sorted(set(assembler.errors)):
+            path, line = Preprocessor.location(lineno)
+            errors.append({"line": line, "message": message} if path is None else {"file": path, "line": line, "message": message})
+        return {"ok": False, "errors": errors}
+    if fmt == "tokens":
+        out = io.StringIO()
+        assembler.print_tokenized_data(file=out)
+        output = out.getvalue()
+    elif fmt == "encoded":
+        out = io.StringIO()
+        assembler.print_encoded(file=out)
+        output = out.getvalue()
+    elif Assembler.output_formats[fmt][1] == "wb":
+        output = base64.b64encode(assembler.segments.render(fmt)).decode()
+    else:
+        output = assembler.segments.render(fmt)
+    return {"ok": True, "format": fmt, "start_address": assembler.start_address, "output": output}
+
+
+def disassemble_job(job):
+    # job: {"source": binary text} or {"bin": base64 image}, plus "include_binary", "base" and
+    # "format" (plain, binary, jsonl or csv)
+    fmt = job.get("format")
+    if fmt is not None and fmt not in Instruction.formats:
+        raise ValueError(f"Unknown format '{fmt}'")
+    base = job.get("base", 0)
+    binary = "bin" in job
+    source = base64.b64decode(job["bin"]) if binary else job["source"]
+    disassembler = Disassembler("<request>", int(base, 0) if isinstance(base, str) else base, source)
+    disassembler.disassemble(binary=binary)
+    return {"ok": True, "output": "\n".join(disassembler.render(job.get("include_binary", False), fmt=fmt))}
+
+
+class AssemblerService:
+    jobs = {"/assemble": ("assemble", assemble_job), "/disassemble": ("disassemble", disassemble_job)}
+
+    def __init__(self, cache_size=1024):
+        self.cache = ResultCache(cache_size)
+        self.metrics = Metrics()
+
+    def run_job(self, op, run, job):
+        source = job.get("source", job.get("bin")) if isinstance(job, dict) else None
+        if not isinstance(source, str):
+            return {"ok": False, "errors": [{"line": None, "message": "Job needs a 'source' (or 'bin') string"}]}
+        if "source" in job and "bin" in job:
+            # the key is taken from the one field the job reads, so it may only carry one
+            return {"ok": False, "errors": [{"line": None, "message": "Job takes a 'source' or a 'bin', not both"}]}
+        options = {k: v for k, v in job.items() if k not in ("source", "bin")}
+        options["input"] = "bin" if "bin" in job else "text"
+        try:
+            key = self.cache.key(op, source, options)
+            result = self.cache.get(key)
+            if result is None:
+                result = run(job)
+                self.cache.put(key, result)
+        except (ValueError, KeyError, TypeError) as e:
+            return {"ok": False, "errors": [{"line": None, "message": str(e)}]}
+        return result
+
+    def handle(self, path, body):
+        # A body is one job object or {"jobs": [...]} for a batch; returns the JSON reply.
+        op, run = self.jobs[path]
+        started = time.perf_counter()
+        if isinstance(body, dict) and isinstance(body.get("jobs"), list):
+            reply = {"results": [self.run_job(op, run, job) for job in body["jobs"]]}
+            count = len(body["jobs"])
+        else:
+            reply = self.run_job(op, run, body)
+            count = 1
+        self.metrics.record(path, count, time.perf_counter() - started)
+        return reply
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    service = None
+    # the only web page allowed to read the replies (the online documentation)
+    origin = "https://puneethreddy592.github.io"
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", self.origin)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", self.origin)
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self.send_json(200, self.service.metrics.snapshot(self.service.cache))
+        else:
+            self.send_json(404, {"error": f"Unknown path '{self.path}'"})
+
+    def do_POST(self):
+        if self.path not in self.service.jobs:
+            self.send_json(404, {"error": f"Unknown path '{self.path}'"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+        except ValueError as e:
+            self.send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if not isinstance(body, dict):
+            self.send_json(400, {"error": "Expected a JSON object"})
+            return
+        self.send_json(200, self.service.handle(self.path, body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=8765, cache_size=1024, origin=RequestHandler.origin):
+    # port 0 picks a free port; the bound one is server.server_address[1]
+    handler = type("Handler", (RequestHandler,), {"service": AssemblerService(cache_size), "origin": origin})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleRisc assemble/disassemble service (HTTP/JSON)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (default: localhost only)")
+    parser.add_argument("-p", "--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("-c", "--cache-size", type=int, default=1024, help="Number of results kept in the LRU cache")
+    parser.add_argument("--origin", default=RequestHandler.origin, help="Web origin allowed to call the service from a browser (CORS)")
+
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.cache_size, args.origin)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]} (POST /assemble, POST /disassemble, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
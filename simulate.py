@@ -0,0 +1,467 @@
+import argparse
+import re
+import sys
+import time
+
+import isa
+from assemble import Assembler, Image, SegmentMap
+from stats import Stats, timed
+
+
+class SimulatorError(Exception):
+    pass
+
+
+class Halt(Exception):
+    pass
+
+
+def divide(x, y):
+    # Signed division truncating toward zero, as in C
+    if y == 0:
+        raise SimulatorError("division by zero")
+    quotient = abs(x) // abs(y)
+    return -quotient if (x < 0) != (y < 0) else quotient
+
+
+def remainder(x, y):
+    return x - y * divide(x, y)
+
+
+def misaligned(address):
+    raise SimulatorError(f"unaligned memory access at 0x{address & 0xFFFFFFFF:X}")
+
+
+class Simulator:
+    # Result of each ALU opcode from operands x and y. Registers hold signed 32-bit values;
+    # results of the opcodes marked True can leave that range and are wrapped back into it.
+    alu_expressions = {
+        "add": ("{x} + {y}", True),
+        "sub": ("{x} - {y}", True),
+        "mul": ("{x} * {y}", True),
+        "div": ("divide({x}, {y})", True),
+        "mod": ("remainder({x}, {y})", False),
+        "and": ("{x} & {y}", False),
+        "or": ("{x} | {y}", False),
+        "lsl": ("{x} << ({y} & 31)", True),
+        "lsr": ("({x} & 0xFFFFFFFF) >> ({y} & 31)", True),
+        "asr": ("{x} >> ({y} & 31)", False),
+    }
+    # a range test is cheaper than masking every result
+    wrap = "if not -0x80000000 <= value <= 0x7FFFFFFF:\n    value = ((value + 0x80000000) & 0xFFFFFFFF) - 0x80000000\n"
+
+    # Predecoded kind -> statements running it, with {a}, {b}, {c} standing for its operands:
+    # rd, rs1 and rs2 or the immediate (already sign/zero-extended or shifted for u/h).
+    # Branches, call, ret and hlt change the control flow and are handled separately.
+    statements = {
+        "nop": "pass",
+        "mov_reg": "regs[{a}] = regs[{c}]",
+        "mov_imm": "regs[{a}] = {c}",
+        "not_reg": "regs[{a}] = ~regs[{c}]",
+        "not_imm": "regs[{a}] = ~{c}",
+        "cmp_reg": "x = regs[{b}]\ny = regs[{c}]\nflags[0] = x == y\nflags[1] = x > y",
+        "cmp_imm": "x = regs[{b}]\nflags[0] = x == {c}\nflags[1] = x > {c}",
+        "ld": "address = regs[{b}] + {c}\nif address & 3:\n    misaligned(address)\nregs[{a}] = memory.get(address, 0)",
+        "st": ("address = regs[{b}] + {c}\nif address & 3:\n    misaligned(address)\nmemory[address] = regs[{a}]\n"
+               "if code_start <= address < code_end:\n    code_written(address)"),
+    }
+    for mnemonic, (expression, wraps) in alu_expressions.items():
+        for form, y in (("_reg", "regs[{c}]"), ("_imm", "{c}")):
+            value = expression.format(x="regs[{b}]", y=y)
+            statements[mnemonic + form] = f"value = {value}\n{wrap}regs[{{a}}] = value" if wraps else f"regs[{{a}}] = {value}"
+    del mnemonic, expression, wraps, form, y, value
+
+    # One handler per kind: handler(a, b, c, index) runs the instruction at code[index] and
+    # returns the index of the next one.
+    handler_source = "".join(
+        f"def {kind}(a, b, c, i):\n" + "".join(f"    {line}\n" for line in statement.format(a="a", b="b", c="c").split("\n"))
+        + "    return i + 1\n"
+        for kind, statement in statements.items()) + """
+def b(a, _, c, i):
+    return c
+
+def beq(a, _, c, i):
+    return c if flags[0] else i + 1
+
+def bgt(a, _, c, i):
+    return c if flags[1] else i + 1
+
+def call(a, _, c, i):
+    regs[15] = code_start + 4 * (i + 1)
+    return c
+
+def ret(a, _, c, i):
+    return return_index(regs[15])
+
+def return_index(address):
+    index, offset = divmod(address - code_start, 4)
+    if offset or not 0 <= index < code_count:
+        raise SimulatorError(f"return to 0x{address & 0xFFFFFFFF:X} outside the program")
+    return index
+
+def hlt(a, _, c, i):
+    raise Halt
+
+def invalid(a, _, c, i):
+    raise SimulatorError(f"invalid instruction word 0x{c:08X}")
+
+def end(a, _, c, i):
+    raise SimulatorError("execution ran past the last instruction")
+
+def outside(a, _, c, i):
+    raise SimulatorError("branch target outside the program")
+"""
+    handler_code = compile(handler_source, "<simulator handlers>", "exec")
+
+    def __init__(self, image, entry=None, stack_pointer=0x100000, stats=None):
+        # image is an assemble.Image (e.g. Assembler.instruction_encoded); execution starts at
+        # entry, the image's first word by default. r14 is the stack pointer, r15 the return
+        # address register.
+        self.stats = stats
+        self.code_start = image.start_address
+        self.words = image.words()
+        self.code_count = len(self.words)
+        self.regs = [0] * 16
+        self.regs[14] = stack_pointer
+        self.flags = [False, False]
+        # word-addressed data memory holding signed values; the program is loaded at its origin
+        self.memory = {self.code_start + 4 * i: word - ((word & 0x80000000) << 1) for i, word in enumerate(self.words)}
+        self.steps = 0
+        self.halted = False
+        self.handlers = {"divide": divide, "remainder": remainder, "misaligned": misaligned,
+                         "SimulatorError": SimulatorError, "Halt": Halt,
+                         "regs": self.regs, "flags": self.flags, "memory": self.memory,
+                         "code_start": self.code_start, "code_end": self.code_start + 4 * self.code_count,
+                         "code_count": self.code_count, "code_written": self.code_written}
+        exec(self.handler_code, self.handlers)
+        self.code = self.predecode()
+        entry = self.code_start if entry is None else entry
+        if (entry - self.code_start) % 4 or not 0 <= entry - self.code_start < 4 * self.code_count:
+            raise SimulatorError(f"entry point 0x{entry:X} is outside the program")
+        self.index = (entry - self.code_start) // 4
+
+    def load(self, image):
+        # Places another segment (e.g. a data section) in memory; only the program image runs
+        self.memory.update((image.start_address + 4 * i, word - ((word & 0x80000000) << 1)) for i, word in enumerate(image.words()))
+
+    @property
+    def pc(self):
+        return self.code_start + 4 * self.index
+
+    def decode(self, word, index):
+        # One word -> (kind, a, b, c); branch targets become code indexes.
+        entry = isa.decode_table[word >> 27]
+        if entry is None:
+            return "invalid", 0, 0, word
+        mnemonic, fmt = entry
+        imm_flag = (word >> 26) & 1
+        rd, rs1, rs2 = (word >> 22) & 0xF, (word >> 18) & 0xF, (word >> 14) & 0xF
+        simm = (word & 0xFFFF) - ((word & 0x8000) << 1)
+        if fmt == "three":
+            if not imm_flag:
+                return mnemonic + "_reg", rd, rs1, rs2
+            mod = (word >> 16) & 3
+            if mod == 2:
+                # h: the immediate fills the upper half and is read back as a signed 32-bit value
+                imm = (word & 0xFFFF) << 16
+                return mnemonic + "_imm", rd, rs1, imm - ((imm & 0x80000000) << 1)
+            return mnemonic + "_imm", rd, rs1, word & 0xFFFF if mod == 1 else simm
+        if fmt == "two":
+            return (mnemonic + "_imm", rd, 0, simm) if imm_flag else (mnemonic + "_reg", rd, 0, rs2)
+        if fmt == "cmp":
+            return ("cmp_imm", 0, rs1, simm) if imm_flag else ("cmp_reg", 0, rs1, rs2)
+        if fmt == "mem":
+            return mnemonic, rd, rs1, simm
+        if fmt == "branch":
+            target = index + (word & 0x7FFFFFF) - ((word & 0x4000000) << 1)
+            return mnemonic, 0, 0, target if 0 <= target < self.code_count else self.code_count + 1
+        return mnemonic, 0, 0, 0
+
+    @timed("predecode")
+    def predecode(self):
+        # The whole image is decoded once into (handler, a, b, c) tuples; two sentinels follow
+        # it, for running off the end and for branches that leave the program.
+        handlers = self.handlers
+        code = []
+        for index, word in enumerate(self.words):
+            kind, a, b, c = self.decode(word, index)
+            code.append((handlers[kind], a, b, c))
+        code.append((handlers["end"], 0, 0, 0))
+        code.append((handlers["outside"], 0, 0, 0))
+        return code
+
+    def code_written(self, address):
+        # A store into the program: predecode the new word so the change takes effect.
+        index = (address - self.code_start) // 4
+        kind, a, b, c = self.decode(self.memory[address] & 0xFFFFFFFF, index)
+        self.code[index] = (self.handlers[kind], a, b, c)
+
+    @timed("run")
+    def run(self, max_steps=None):
+        # Runs until hlt, an error or max_steps instructions; returns the number executed.
+        return self.run_steps(max_steps)
+
+    def run_steps(self, max_steps=None, chunk=65536):
+        code = self.code
+        i = self.index
+        executed = 0
+        step = -1
+        try:
+            while max_steps is None or executed < max_steps:
+                count = chunk if max_steps is None else min(chunk, max_steps - executed)
+                for step in range(count):
+                    handler, a, b, c = code[i]
+                    i = handler(a, b, c, i)
+                executed += count
+                step = -1
+        except Halt:
+            executed += step + 1
+            self.halted = True
+        except SimulatorError as e:
+            executed += step
+            raise SimulatorError(f"0x{self.code_start + 4 * i:X}: {e}") from None
+        finally:
+            self.index = i
+            self.steps += executed
+            if self.stats is not None:
+                self.stats.count("executed", executed)
+        return executed
+
+    def print_registers(self, file=None):
+        for number, value in enumerate(self.regs):
+            print(f"r{number:<2} = 0x{value & 0xFFFFFFFF:08X} ({value})", file=file)
+        print(f"flags: E={int(self.flags[0])} GT={int(self.flags[1])}  pc = 0x{self.pc:X}", file=file)
+
+
+class BlockSimulator(Simulator):
+    # Runs whole blocks of instructions instead of single ones. A block is translated on first
+    # use into one Python function, the statements of its instructions with the operands filled
+    # in, and cached by its start index. Translation follows the straight-line path from the
+    # start: conditional branches become early returns, unconditional jumps are followed, and
+    # it stops at a branch target reached by falling through, a call, ret or hlt. A branch
+    # back to the start turns the whole block into a loop. Inside the function the registers
+    # and flags it uses are local variables, stored back when it returns or raises.
+    # A store into the program drops every cached block containing the written word.
+    max_block = 256
+
+    def __init__(self, image, entry=None, stack_pointer=0x100000, stats=None):
+        super().__init__(image, entry, stack_pointer, stats)
+        self.blocks = {}
+        self.leaders = {self.index}
+        for index, word in enumerate(self.words):
+            self.add_leaders(index, word)
+
+    def add_leaders(self, index, word):
+        # branch targets, and return addresses after a call
+        kind, a, b, c = self.decode(word, index)
+        if kind in ("b", "beq", "bgt", "call"):
+            self.leaders.add(c)
+        if kind == "call":
+            self.leaders.add(index + 1)
+
+    def code_written(self, address):
+        super().code_written(address)
+        index = (address - self.code_start) // 4
+        self.add_leaders(index, self.memory[address] & 0xFFFFFFFF)
+        for start in [start for start, block in self.blocks.items() if index in block[3]]:
+            del self.blocks[start]
+
+    def translate(self, start):
+        # Returns (function, longest path, (index, position) of every source line, indexes).
+        # function(limit) runs the block and returns (next index, instructions executed); a
+        # looping block only starts another pass while the longest path still fits in limit.
+        body = []
+        covered = set()
+        index = start
+        done = 0
+        if start >= self.code_count:
+            # running off the end, or a branch that left the program
+            body.append((("end" if start == self.code_count else "outside") + "(0, 0, 0, 0)", (start, 0)))
+        while start < self.code_count:
+            if index == start and done:
+                body.extend(self.back_edge(start, done, (index, done)))
+                break
+            if index in covered or index >= self.code_count or done >= self.max_block or (done and index in self.leaders):
+                body.append((f"return {index}, count + {done}", (index, done)))
+                break
+            covered.add(index)
+            kind, a, b, c = self.decode(self.memory[self.code_start + 4 * index] & 0xFFFFFFFF, index)
+            at = (index, done)
+            done += 1
+            if kind in self.statements:
+                body.extend((line, at) for line in self.statements[kind].format(a=a, b=b, c=c).split("\n"))
+                if kind == "st":
+                    # the store may have rewritten this very block: leave it
+                    body.append((f"    return {index + 1}, count + {done}", at))
+                index += 1
+            elif kind in ("beq", "bgt"):
+                body.append((f"if flags[{0 if kind == 'beq' else 1}]:", at))
+                if c == start:
+                    body.extend(("    " + line, position) for line, position in self.back_edge(start, done, at))
+                else:
+                    body.append((f"    return {c}, count + {done}", at))
+                index += 1
+            elif kind == "b":
+                if c == start:
+                    body.extend(self.back_edge(start, done, at))
+                    break
+                if c in covered or not 0 <= c < self.code_count:
+                    body.append((f"return {c}, count + {done}", at))
+                    break
+                index = c
+            elif kind == "call":
+                body.append((f"regs[15] = {self.code_start + 4 * (index + 1)}", at))
+                body.append((f"return {c}, count + {done}", at))
+                break
+            elif kind == "ret":
+                body.append((f"return return_index(regs[15]), count + {done}", at))
+                break
+            else:
+                body.append((f"{kind}(0, 0, {c}, 0)", at))
+                break
+
+        text = "\n".join(line for line, _ in body).replace("{longest}", str(done))
+        registers = sorted({int(number) for number in re.findall(r"regs\[(\d+)\]", text)})
+        uses_flags = "flags[" in text
+        lines = [("def block(limit, regs=regs, flags=flags, memory=memory):", None), ("    count = 0", None)]
+        lines.extend((f"    r{number} = regs[{number}]", None) for number in registers)
+        if uses_flags:
+            lines.append(("    flag0, flag1 = flags", None))
+        lines.append(("    try:", None))
+        lines.append(("        while True:", None))
+        lines.extend(("            " + re.sub(r"(regs|flags)\[(\d+)\]", lambda m: ("r" if m[1] == "regs" else "flag") + m[2], line), at)
+                     for line, (_, at) in zip(text.split("\n"), body))
+        lines.append(("    finally:", None))
+        lines.extend((f"        regs[{number}] = r{number}", None) for number in registers)
+        if uses_flags:
+            lines.extend((("        flags[0] = flag0", None), ("        flags[1] = flag1", None)))
+        if not registers and not uses_flags:
+            lines.append(("        pass", None))
+
+        source = "".join(line + "\n" for line, _ in lines)
+        namespace = {}
+        exec(compile(source, f"<block 0x{self.code_start + 4 * start:X}>", "exec"), self.handlers, namespace)
+        # source line number (from 1) -> (index, position on the path) of its instruction
+        block = (namespace["block"], max(done, 1), [None] + [at for _, at in lines], covered)
+        self.blocks[start] = block
+        if self.stats is not None:
+            self.stats.count("blocks_translated")
+        return block
+
+    def back_edge(self, start, done, at):
+        # A branch back to the block's start: one more pass if the longest path still fits
+        return [(f"count += {done}", at), ("if count + {longest} > limit:", at),
+                (f"    return {start}, count", at), ("continue", at)]
+
+    @timed("run")
+    def run(self, max_steps=None):
+        blocks = self.blocks
+        limit = sys.maxsize if max_steps is None else max_steps
+        i = self.index
+        executed = 0
+        try:
+            while True:
+                block = blocks.get(i)
+                if block is None:
+                    block = self.translate(i)
+                if executed + block[1] > limit:
+                    break
+                i, count = block[0](limit - executed)
+                executed += count
+        except (Halt, SimulatorError) as e:
+            # find the instruction that stopped the block from the line its frame was running
+            frame_info = e.__traceback__
+            while frame_info is not None and frame_info.tb_frame.f_code is not block[0].__code__:
+                frame_info = frame_info.tb_next
+            i, position = block[2][frame_info.tb_lineno]
+            executed += frame_info.tb_frame.f_locals["count"] + position
+            if isinstance(e, Halt):
+                executed += 1
+                self.halted = True
+            else:
+                raise SimulatorError(f"0x{self.code_start + 4 * i:X}: {e}") from None
+        finally:
+            self.index = i
+            self.steps += executed
+            if self.stats is not None:
+                self.stats.count("executed", executed)
+        if self.halted:
+            return executed
+        # fewer steps left than the next block may run: finish one instruction at a time
+        return executed + self.run_steps(limit - executed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleRisc Simulator")
+    parser.add_argument("-f", "--file", required=True, help="Assembly file to run (or a .bin image or .seg container with -b)")
+    parser.add_argument("-b", "--bin", action="store_true", help="Input is a raw big-endian .bin image or a .seg container (as written by assemble.py -b / -sg)")
+    parser.add_argument("-a", "--base", type=lambda value: int(value, 0), default=0x0000, help="Load address of a .bin image, e.g. 0x1000 to match .org 0x1000")
+    parser.add_argument("-n", "--max-steps", type=int, help="Stop after this many instructions")
+    parser.add_argument("--sp", type=lambda value: int(value, 0), default=0x100000, help="Initial stack pointer (r14)")
+    parser.add_argument("-r", "--registers", action="store_true", help="Print the registers and flags when the run ends")
+    parser.add_argument("--blocks", action="store_true", help="Translate basic blocks into Python functions and run those (faster on loops)")
+    parser.add_argument("--stats", action="store_true", help="Print per-phase timings and counters to stderr")
+
+    args = parser.parse_args()
+    stats = Stats() if args.stats else None
+    entry = None
+    try:
+        if args.bin:
+            with open(args.file, "rb") as f:
+                data = f.read()
+            if data[:4] == SegmentMap.magic:
+                segments = SegmentMap.from_bytes(data)
+                entry = segments.entry
+            else:
+                image = Image(args.base)
+                image.extend(data)
+                del image[len(image) - len(image) % 4:]
+                segments = SegmentMap([image])
+        else:
+            assembler = Assembler(args.file, stats=stats)
+            assembler.parse_data()
+            if assembler.errors:
+                assembler.print_errors()
+                sys.exit(1)
+            segments = assembler.segments
+            entry = assembler.labels.get(".main")
+    except FileNotFoundError:
+        print(f"Error: File '{args.file}' not found.")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {args.file}: {e}")
+        sys.exit(1)
+
+    # the section holding the entry point is the program, the others are loaded as data
+    start = segments.entry if entry is None else entry
+    image = next((segment for segment in segments if segment.start_address <= start < segment.start_address + len(segment)), segments[0] if segments else Image(args.base))
+    try:
+        simulator = (BlockSimulator if args.blocks else Simulator)(image, entry, args.sp, stats)
+    except SimulatorError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    for segment in segments:
+        if segment is not image:
+            simulator.load(segment)
+
+    failed = False
+    started = time.perf_counter()
+    try:
+        simulator.run(args.max_steps)
+    except SimulatorError as e:
+        print(f"Error: {e}")
+        failed = True
+    elapsed = time.perf_counter() - started
+
+    state = "halted" if simulator.halted else "failed" if failed else "stopped"
+    print(f"Executed {simulator.steps} instructions ({state}) in {elapsed:.3f} s: "
+          f"{simulator.steps / elapsed if elapsed else 0:.0f} instructions/sec")
+    if args.registers:
+        simulator.print_registers()
+    if stats is not None:
+        stats.report(sys.stderr)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
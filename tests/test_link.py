@@ -0,0 +1,56 @@
+import os
+
+from assemble import assemble_source
+from link import Linker
+
+MAIN = ".main:\nmov r1, 1\ncall .work\nhlt\n.back:\nret\n"
+WORK = ".work:\nadd r1, r1, 1\nbeq .back\nb .main\n"
+
+
+def words(assembler):
+    return assembler.segments.flatten().words()
+
+
+def touch(path, seconds=10):
+    # moves the mtime forward explicitly, so coarse file system timestamps cannot hide the change
+    mtime = os.stat(path).st_mtime_ns + seconds * 10**9
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_branches_across_files_match_one_file(tmp_path):
+    (tmp_path / "main.s").write_text(MAIN)
+    (tmp_path / "work.s").write_text(WORK)
+    linker = Linker([str(tmp_path / "main.s"), str(tmp_path / "work.s")], base=0x1000)
+    assert linker.build(), linker.errors
+    expected = assemble_source(".org 0x1000\n" + MAIN + WORK)
+    assert words(linker) == words(expected)
+    assert linker.segments.entry == expected.entry_point() == 0x1000
+
+
+def test_touched_source_reuses_its_object(tmp_path):
+    paths = [str(tmp_path / "main.s"), str(tmp_path / "work.s")]
+    (tmp_path / "main.s").write_text(MAIN)
+    (tmp_path / "work.s").write_text(WORK)
+    assert Linker(paths).build()
+    touch(paths[1])
+    # a fresh linker has no objects in memory, so the .o files are read back from disk
+    linker = Linker(paths)
+    assert linker.build()
+    assert (linker.assembled, linker.reused) == (0, 2)
+    assert linker.objects[1].source_mtime == os.stat(paths[1]).st_mtime_ns
+
+
+def test_edited_include_reassembles_the_object(tmp_path):
+    paths = [str(tmp_path / "main.s"), str(tmp_path / "work.s")]
+    (tmp_path / "main.s").write_text(MAIN)
+    (tmp_path / "step.s").write_text("add r1, r1, 1\n")
+    (tmp_path / "work.s").write_text('.work:\n.include "step.s"\nbeq .back\nb .main\n')
+    linker = Linker(paths)
+    assert linker.build()
+    before = words(linker)
+    (tmp_path / "step.s").write_text("add r1, r1, 2\n")
+    touch(tmp_path / "step.s")
+    assert linker.build()
+    assert (linker.assembled, linker.reused) == (1, 1)
+    assert words(linker) == words(assemble_source(MAIN + WORK.replace("r1, 1", "r1, 2")))
+    assert words(linker) != before
@@ -0,0 +1,100 @@
+import pytest
+
+from assemble import Assembler, SegmentMap, assemble_source
+
+# two sections with a gap between them; the second one crosses a 64 KiB boundary
+SOURCE = """.org 0x1000
+.main:
+mov r1, 1
+b .far
+hlt
+.org 0xFFF8
+.far:
+add r1, r1, 2
+sub r2, r1, r3
+mul r3, r2, 7
+b .main
+"""
+
+
+def memory(assembler):
+    # address -> byte of every word the program holds
+    return {segment.start_address + offset: byte for segment in assembler.segments for offset, byte in enumerate(segment)}
+
+
+def read_ihex(text):
+    data, upper, entry = {}, 0, None
+    for line in text.splitlines():
+        record = bytes.fromhex(line[1:])
+        assert line[0] == ":" and not sum(record) & 0xFF and record[0] == len(record) - 5
+        address, kind, payload = int.from_bytes(record[1:3], "big"), record[3], record[4:-1]
+        if kind == 0:
+            data.update(((upper << 16) + address + offset, byte) for offset, byte in enumerate(payload))
+        elif kind == 4:
+            upper = int.from_bytes(payload, "big")
+        elif kind == 5:
+            entry = int.from_bytes(payload, "big")
+        else:
+            assert kind == 1 and line == text.splitlines()[-1]
+    return data, entry
+
+
+def read_srec(text):
+    data, entry = {}, None
+    for line in text.splitlines():
+        record = bytes.fromhex(line[2:])
+        assert line[0] == "S" and record[-1] == ~sum(record[:-1]) & 0xFF and record[0] == len(record) - 1
+        kind = line[1]
+        if kind == "3":
+            address = int.from_bytes(record[1:5], "big")
+            data.update((address + offset, byte) for offset, byte in enumerate(record[5:-1]))
+        elif kind == "7":
+            entry = int.from_bytes(record[1:5], "big")
+        else:
+            assert kind == "0"
+    return data, entry
+
+
+@pytest.fixture
+def program():
+    assembler = assemble_source(SOURCE)
+    assert not assembler.errors
+    return assembler
+
+
+def test_ihex_and_srec_decode_to_the_image(program):
+    assert read_ihex(program.segments.render("ihex")) == (memory(program), 0x1000)
+    assert read_srec(program.segments.render("srec")) == (memory(program), 0x1000)
+
+
+def test_seg_round_trip(program):
+    segments = SegmentMap.from_bytes(program.segments.render("seg"))
+    assert [(segment.start_address, bytes(segment)) for segment in segments] == \
+        [(segment.start_address, bytes(segment)) for segment in program.segments]
+    assert segments.entry == 0x1000
+
+
+@pytest.mark.parametrize("data", [b"SRSG\x00\x00\x10\x00\x00\x00\x00\x08\x00\x00", b"XXXX", b"SRSG\x00\x00\x10\x00\x00\x00\x00\x03abc"])
+def test_bad_seg_containers(data):
+    with pytest.raises(ValueError):
+        SegmentMap.from_bytes(data)
+
+
+def test_flat_image_fills_the_gap(program):
+    image = program.segments.render("bin")
+    assert len(image) == 0xFFF8 + 16 - 0x1000
+    assert image[12:0xFFF8 - 0x1000] == bytes(0xFFF8 - 0x1000 - 12)
+    assert {0x1000 + offset: byte for offset, byte in enumerate(image) if 0x1000 + offset in memory(program)} == memory(program)
+
+
+def test_streamed_files_match_the_rendered_formats(program, tmp_path):
+    source = tmp_path / "prog.s"
+    source.write_text(SOURCE)
+    outputs = {fmt: str(tmp_path / name) for fmt, (name, _, _) in Assembler.output_formats.items()}
+    assembler = Assembler(str(source))
+    assembler.parse_labels()
+    assembler.write_outputs(outputs, assembler.iter_encoded())
+    assert not assembler.errors
+    for fmt, path in outputs.items():
+        with open(path, "rb" if Assembler.output_formats[fmt][1] == "wb" else "r") as file:
+            assert file.read() == program.segments.render(fmt), fmt
@@ -0,0 +1,59 @@
+import threading
+
+from assemble import Assembler, assemble_source
+from preprocess import Preprocessor
+
+
+def assemble(path):
+    assembler = Assembler(str(path))
+    assembler.parse_data()
+    return assembler
+
+
+def test_include_macro_and_equ(tmp_path):
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "macros.s").write_text(".equ STEP, 4\n.macro bump reg\nadd \\reg, \\reg, STEP\n.endm\n")
+    (tmp_path / "main.s").write_text('.include "lib/macros.s"\nmov r1, 1\nbump r1\nhlt\n')
+    expected = assemble_source("mov r1, 1\nadd r1, r1, 4\nhlt\n")
+    assembler = assemble(tmp_path / "main.s")
+    assert not assembler.errors
+    assert assembler.segments.flatten().words() == expected.segments.flatten().words()
+
+
+def test_errors_point_into_included_files(tmp_path):
+    (tmp_path / "bad.s").write_text("nop\nfoo r1\n")
+    (tmp_path / "main.s").write_text('nop\n.include "bad.s"\n.include "missing.s"\n')
+    assembler = assemble(tmp_path / "main.s")
+    places = sorted(Preprocessor.where(lineno) for lineno, _ in assembler.errors)
+    assert places == [f"{tmp_path / 'bad.s'}: line 2", "line 3"]
+
+
+def test_unreadable_includes_are_errors(tmp_path):
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "data.s").write_bytes(b"\xff\xfe\x00")
+    (tmp_path / "main.s").write_text('nop\n.include "dir"\n.include "data.s"\n')
+    assembler = assemble(tmp_path / "main.s")
+    assert sorted(assembler.errors) == [(2, "Cannot include 'dir': Is a directory"),
+                                        (3, "Cannot include 'data.s': not a text file (invalid start byte)")]
+
+
+def test_recursive_include(tmp_path):
+    (tmp_path / "a.s").write_text('.include "b.s"\n')
+    (tmp_path / "b.s").write_text('.include "a.s"\n')
+    assembler = assemble(tmp_path / "a.s")
+    assert [message for _, message in assembler.errors] == ["Recursive '.include' of 'a.s'"]
+
+
+def test_file_ids_from_many_threads(tmp_path):
+    paths = [str(tmp_path / f"file{n}.s") for n in range(2000)]
+
+    def register(chunk):
+        for path in chunk:
+            Preprocessor.file_id(path)
+
+    threads = [threading.Thread(target=register, args=(paths[n::8],)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(Preprocessor.files[Preprocessor.file_id(path)] == path for path in paths)
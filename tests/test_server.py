@@ -0,0 +1,70 @@
+import json
+import threading
+import urllib.request
+
+import pytest
+
+from server import make_server
+
+
+@pytest.fixture
+def url():
+    # A server on a free localhost port, for the duration of one test
+    server = make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, path, body):
+    request = urllib.request.Request(url + path, json.dumps(body).encode(), {"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)
+
+
+def test_assemble_and_disassemble(url):
+    reply = post(url, "/assemble", {"source": "mov r1, 5\nhlt\n", "format": "bintxt"})
+    assert reply["ok"]
+    reply = post(url, "/disassemble", {"source": reply["output"]})
+    assert reply == {"ok": True, "output": "mov r1, 5\nhlt"}
+
+
+def test_errors_name_the_line(url):
+    reply = post(url, "/assemble", {"source": "nop\nfoo r1\n"})
+    assert not reply["ok"]
+    assert [error["line"] for error in reply["errors"]] == [2]
+
+
+def test_batch_and_cache(url):
+    job = {"source": "nop\n", "format": "hex"}
+    reply = post(url, "/assemble", {"jobs": [job, job]})
+    assert reply["results"][0] == reply["results"][1]
+    with urllib.request.urlopen(url + "/metrics", timeout=10) as response:
+        metrics = json.load(response)
+    assert metrics["cache"]["hits"] == 1
+    assert metrics["endpoints"]["/assemble"]["jobs"] == 2
+
+
+@pytest.mark.parametrize("job", [{"source": "nop", "format": ["x"]}, {"source": "nop", "format": {"a": 1}},
+                                 {"source": 5}, {"bin": "not base64!"}, {"source": "0" * 32, "bin": "AAAAAA=="}])
+def test_bad_jobs_get_json_errors(url, job):
+    reply = post(url, "/assemble" if "source" in job else "/disassemble", job)
+    assert reply["ok"] is False
+    assert reply["errors"][0]["message"]
+
+
+def test_include_is_refused(url, tmp_path):
+    secret = tmp_path / "secret.s"
+    secret.write_text("password\n")
+    reply = post(url, "/assemble", {"source": f'.include "{secret}"\n'})
+    assert not reply["ok"]
+    assert "password" not in json.dumps(reply)
+    assert reply["errors"] == [{"line": 1, "message": "'.include' is not allowed here"}]
+
+
+def test_cors_names_the_documentation_origin(url):
+    request = urllib.request.Request(url + "/metrics", method="OPTIONS")
+    with urllib.request.urlopen(request, timeout=10) as response:
+        assert response.headers["Access-Control-Allow-Origin"] == "https://puneethreddy592.github.io"
@@ -0,0 +1,75 @@
+import pytest
+
+from assemble import assemble_source
+from simulate import BlockSimulator, Simulator, SimulatorError
+
+
+def run(source, engine):
+    # Registers after running source to its hlt
+    assembler = assemble_source(source, "<test>")
+    assert not assembler.errors
+    simulator = engine(assembler.segments.flatten())
+    simulator.run(max_steps=10_000)
+    assert simulator.halted
+    return simulator.regs
+
+
+engines = pytest.mark.parametrize("engine", [Simulator, BlockSimulator])
+
+# (instruction, value of r1 after it) with r2 = -5 and r3 = 3 set beforehand
+alu_cases = [
+    ("add r1, r2, -1", -6), ("sub r1, r2, -7", 2), ("mul r1, r2, -3", 15),
+    ("div r1, r2, 2", -2), ("div r1, r2, -2", 2), ("mod r1, r2, -2", -1), ("mod r1, r2, 2", -1),
+    ("and r1, r2, -1", -5), ("and r1, r2, -2", -6), ("or r1, r0, -1", -1), ("or r1, r2, 2", -5),
+    ("asr r1, r2, 1", -3), ("lsr r1, r2, 28", 15), ("lsl r1, r2, 1", -10), ("lsl r1, r3, 31", -2147483648),
+    ("andu r1, r2, 0xFFFF", 0xFFFB), ("oru r1, r0, 0x8000", 0x8000), ("addu r1, r0, 65535", 65535),
+    ("addh r1, r0, -32768", -2147483648), ("orh r1, r0, 0x7FFF", 0x7FFF0000), ("andh r1, r2, -1", -65536),
+    ("add r1, r2, r3", -2), ("and r1, r2, r3", 3), ("or r1, r2, r3", -5), ("mod r1, r2, r3", -2),
+    ("asr r1, r2, r3", -1), ("not r1, r2", 4), ("not r1, -1", 0), ("mov r1, r2", -5),
+]
+
+
+@engines
+@pytest.mark.parametrize("instruction, expected", alu_cases)
+def test_alu(engine, instruction, expected):
+    regs = run(f"mov r2, -5\nmov r3, 3\n{instruction}\nhlt\n", engine)
+    assert regs[1] == expected
+
+
+@engines
+def test_results_wrap_to_32_bits(engine):
+    regs = run("addh r1, r0, 0x7FFF\naddu r1, r1, 0xFFFF\nadd r2, r1, 1\nmul r3, r1, r1\nhlt\n", engine)
+    assert regs[1] == 0x7FFFFFFF
+    assert regs[2] == -0x80000000
+    assert regs[3] == 1
+
+
+@engines
+def test_memory_and_branches(engine):
+    source = """
+        mov r1, 0
+        mov r2, 10
+        mov r4, 0x400
+    .loop:
+        add r1, r1, r2
+        sub r2, r2, 1
+        cmp r2, 0
+        bgt .loop
+        st r1, 4[r4]
+        ld r5, 4[r4]
+        call .double
+        hlt
+    .double:
+        add r5, r5, r5
+        ret
+    """
+    regs = run(source, engine)
+    assert regs[1] == 55
+    assert regs[5] == 110
+
+
+@engines
+def test_division_by_zero(engine):
+    assembler = assemble_source("mov r1, 1\ndiv r2, r1, r0\nhlt\n", "<test>")
+    with pytest.raises(SimulatorError):
+        engine(assembler.segments.flatten()).run()
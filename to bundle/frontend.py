@@ -1,21 +1,66 @@
 import sys
-import subprocess
-import os
+import io
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QTextEdit,
-                             QPushButton, QLabel, QComboBox, QTabWidget)
+                             QPushButton, QLabel, QComboBox, QTabWidget, QCheckBox)
 from PyQt6.QtGui import QFont
-from PyQt6.QtCore import Qt
-import sys
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
+from assemble import Assembler, assemble_source
+from unassemble import Disassembler
+
+assemble_options = {"Tokens (-t)": "-t", "Encoded (-e)": "-e", "Binary File (-tb)": "bintxt", "Hex File (-th)": "hextxt", "Binary (-b)": "bin", "Hex (-hh)": "hex"}
+disassemble_options = {"Include Binary (-i)": True, "Default Output": False}
+
+
+def assemble_text(source, option, write_files=True):
+    # Runs the assembler in-process on the editor text. File formats are written like the CLI
+    # does unless write_files is off (live preview), and text formats are shown directly.
+    assembler = assemble_source(source, "assembly")
+    out = io.StringIO()
+    if assembler.errors:
+        assembler.print_errors(out)
+    elif option == "-t":
+        assembler.print_tokenized_data(file=out)
+    elif option == "-e":
+        assembler.print_encoded(file=out)
+    else:
+        if write_files:
+            assembler.write_outputs({option: Assembler.output_formats[option][0]}, file=out)
+        if option in ("bintxt", "hextxt") or not write_files:
+            # a .bin image is previewed as hex
+            return getattr(assembler.instruction_encoded, "render_" + ("hex" if option == "bin" else option))()
+    return out.getvalue()
+
+
+def disassemble_text(source, include_binary):
+    disassembler = Disassembler("binary", source=source)
+    disassembler.disassemble()
+    return "\n".join(disassembler.render(include_binary))
+
+
+class Worker(QThread):
+    # Runs one job off the GUI thread; the sequence number lets stale results be dropped.
+    result = pyqtSignal(int, str)
+
+    def __init__(self, seq, job, *args):
+        super().__init__()
+        self.seq = seq
+        self.job = job
+        self.args = args
 
-if getattr(sys, 'frozen', False):
-    base_path = sys._MEIPASS  # Extracted folder for PyInstaller
-else:
-    base_path = os.path.dirname(os.path.abspath(__file__))
+    def run(self):
+        try:
+            text = self.job(*self.args)
+        except Exception as e:
+            text = f"Exception: {str(e)}"
+        self.result.emit(self.seq, text)
 
 
 class SimpleRiscGUI(QWidget):
     def __init__(self):
         super().__init__()
+        self.workers = set()
+        self.latest = {}
+        self.job_seq = 0
         self.initUI()
     
     def initUI(self):
@@ -48,8 +93,19 @@ class SimpleRiscGUI(QWidget):
         self.option_box.addItems(["Tokens (-t)", "Encoded (-e)", "Binary File (-tb)", "Hex File (-th)", "Binary (-b)", "Hex (-hh)"])
         layout.addWidget(self.option_box)
         
+        self.live_box = QCheckBox("Live preview")
+        layout.addWidget(self.live_box)
+
+        # live preview reassembles shortly after typing stops
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(300)
+        self.preview_timer.timeout.connect(lambda: self.runAssembler(live=True))
+        self.text_edit.textChanged.connect(lambda: self.live_box.isChecked() and self.preview_timer.start())
+        self.option_box.currentTextChanged.connect(lambda: self.live_box.isChecked() and self.preview_timer.start())
+        
         self.run_button = QPushButton("Assemble")
-        self.run_button.clicked.connect(self.runAssembler)
+        self.run_button.clicked.connect(lambda: self.runAssembler())
         layout.addWidget(self.run_button)
         
         self.output_label = QLabel("Output:")
@@ -80,7 +136,7 @@ class SimpleRiscGUI(QWidget):
         layout.addWidget(self.unasm_option_box)
         
         self.unasm_run_button = QPushButton("Disassemble")
-        self.unasm_run_button.clicked.connect(self.runDisassembler)
+        self.unasm_run_button.clicked.connect(lambda: self.runDisassembler())
         layout.addWidget(self.unasm_run_button)
         
         self.unasm_output_label = QLabel("Output:")
@@ -127,49 +183,22 @@ class SimpleRiscGUI(QWidget):
         tab.setLayout(layout)
         return tab
     
-    def runAssembler(self):
-        assemble_path = os.path.join(base_path, "assemble.py")
-        with open("assembly.txt", "w") as f:
-            f.write(self.text_edit.toPlainText())
-        
-        option_map = {"Tokens (-t)": "-t", "Encoded (-e)": "-e", "Binary File (-tb)": "-tb", "Hex File (-th)": "-th", "Binary (-b)": "-b", "Hex (-hh)": "-hh"}
-        selected_option = option_map[self.option_box.currentText()]
-        
-        result = subprocess.run(["python", assemble_path, "-f", "assembly.txt", selected_option], capture_output=True, text=True)
-        output_text = result.stdout if result.stdout else result.stderr
-        
-        if selected_option in ["-tb", "-th"]:
-            output_filename = "outputbin.txt" if selected_option == "-tb" else "outputhex.txt"
-            try:
-                with open(output_filename, "r") as f:
-                    output_text = f.read()
-            except FileNotFoundError:
-                output_text = "Error: Output file not found."
-        
-        self.output_text.setText(output_text)
+    def startJob(self, target, job, *args):
+        self.job_seq += 1
+        self.latest[target] = self.job_seq
+        worker = Worker(self.job_seq, job, *args)
+        worker.result.connect(lambda seq, text: self.latest[target] == seq and target.setText(text))
+        worker.finished.connect(lambda: self.workers.discard(worker))
+        self.workers.add(worker)
+        worker.start()
+
+    def runAssembler(self, live=False):
+        option = assemble_options[self.option_box.currentText()]
+        self.startJob(self.output_text, assemble_text, self.text_edit.toPlainText(), option, not live)
     
     def runDisassembler(self):
-        disassemble_path = os.path.join(base_path, "unassemble.py")
-        with open("binary.txt", "w") as f:
-            f.write(self.unasm_text_edit.toPlainText())
-        
-        output_file = "disassembled_output.txt"
-        option_map = {"Include Binary (-i)": "-i", "Default Output": ""}
-        selected_option = option_map[self.unasm_option_box.currentText()]
-        
-        command = ["python", disassemble_path, "-f", "binary.txt", "-o", output_file]
-        if selected_option:
-            command.append(selected_option)
-        
-        subprocess.run(command, capture_output=True, text=True)
-        
-        try:
-            with open(output_file, "r") as f:
-                output_text = f.read()
-        except FileNotFoundError:
-            output_text = "Error: disassembled_output.txt not found."
-        
-        self.unasm_output_text.setText(output_text)
+        include_binary = disassemble_options[self.unasm_option_box.currentText()]
+        self.startJob(self.unasm_output_text, disassemble_text, self.unasm_text_edit.toPlainText(), include_binary)
     
 if __name__ == "__main__":
     app = QApplication(sys.argv)
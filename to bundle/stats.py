@@ -0,0 +1,120 @@
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Stats:
+    # Wall time per phase plus counters for an Assembler or Disassembler run. Assign one to
+    # obj.stats to collect; while stats is None the pipeline skips all of this.
+    # hook(event, phase, stats) is called with "start" and "end" around every phase, e.g. to
+    # switch an external profiler on and off. trace_memory adds each phase's tracemalloc peak,
+    # at the price of a much slower run.
+    def __init__(self, hook=None, trace_memory=False):
+        self.hook = hook
+        self.trace_memory = trace_memory
+        self.phases = {}
+        self.traced_peaks = {}
+        self.counters = Counter()
+        self.opcodes = Counter()
+        self.bytes_written = Counter()
+        self.rss_peak = None
+
+    @contextmanager
+    def phase(self, name):
+        if self.hook is not None:
+            self.hook("start", name, self)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+            if self.trace_memory:
+                self.traced_peaks[name] = max(self.traced_peaks.get(name, 0), tracemalloc.get_traced_memory()[1])
+            if self.hook is not None:
+                self.hook("end", name, self)
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def count_opcodes(self, words, names):
+        # names maps opcode value -> mnemonic; returns this block's counts by mnemonic
+        counts = Counter()
+        for op, amount in Counter(word >> 27 for word in words).items():
+            counts[names.get(op, "unknown")] += amount
+        self.opcodes.update(counts)
+        return counts
+
+    def peak_memory(self):
+        # Peak resident set size of this process in bytes (None where resource is unavailable)
+        if resource is None:
+            return self.rss_peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if sys.platform == "darwin" else peak * 1024
+        return max(peak, self.rss_peak or 0)
+
+    def as_dict(self):
+        return {
+            "phases": dict(self.phases),
+            "total_seconds": sum(self.phases.values()),
+            "counters": dict(self.counters),
+            "opcodes": dict(self.opcodes.most_common()),
+            "bytes_written": dict(self.bytes_written),
+            "peak_memory": self.peak_memory(),
+            "traced_peaks": dict(self.traced_peaks),
+        }
+
+    def merge(self, data):
+        # Adds another run's as_dict() (e.g. from a batch worker process) into this one.
+        for name, seconds in data["phases"].items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        for name, peak in data["traced_peaks"].items():
+            self.traced_peaks[name] = max(self.traced_peaks.get(name, 0), peak)
+        self.counters.update(data["counters"])
+        self.opcodes.update(data["opcodes"])
+        self.bytes_written.update(data["bytes_written"])
+        if data["peak_memory"] is not None:
+            self.rss_peak = max(self.rss_peak or 0, data["peak_memory"])
+
+    def report(self, file=None):
+        total = sum(self.phases.values())
+        instructions = self.counters.get("instructions", 0)
+        for name, seconds in self.phases.items():
+            traced = f"  peak {self.traced_peaks[name] / 2**20:.1f} MiB" if name in self.traced_peaks else ""
+            print(f"{name:<18} {seconds * 1000:>10.2f} ms{traced}", file=file)
+        rate = f" ({instructions / total:.0f} instructions/sec)" if total and instructions else ""
+        print(f"{'total':<18} {total * 1000:>10.2f} ms{rate}", file=file)
+        if self.counters:
+            print("counters: " + ", ".join(f"{name} {value}" for name, value in self.counters.items()), file=file)
+        if self.opcodes:
+            print("opcodes: " + ", ".join(f"{name} {value}" for name, value in self.opcodes.most_common()), file=file)
+        if self.bytes_written:
+            print("bytes written: " + ", ".join(f"{fmt} {size}" for fmt, size in self.bytes_written.items()), file=file)
+        peak = self.peak_memory()
+        if peak is not None:
+            print(f"peak memory: {peak / 2**20:.1f} MiB", file=file)
+
+
+def timed(phase):
+    # Method decorator: runs the method inside self.stats.phase(phase) when stats are collected,
+    # and costs one extra call otherwise.
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.stats is None:
+                return method(self, *args, **kwargs)
+            with self.stats.phase(phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
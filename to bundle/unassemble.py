@@ -1,130 +1,472 @@
 import argparse
+import io
+import mmap
+import os
+import sys
+from array import array
+from contextlib import nullcontext
+from itertools import islice
 
-class Disassembler:
-    opcodes = {
-        "00000": "add", "00001": "sub", "00010": "mul", "00011": "div", "00100": "mod", "00101": "cmp",
-        "00110": "and", "00111": "or", "01000": "not", "01001": "mov", "01010": "lsl", "01011": "lsr",
-        "01100": "asr", "01101": "nop", "01110": "ld", "01111": "st",
-        "10000": "beq", "10001": "bgt", "10010": "b", "10011": "call", "10100": "ret", "11111": "hlt"
+import isa
+from stats import Stats, timed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Instruction:
+    # One decoded word. mnemonic is None for an unknown opcode and includes the u/h modifier;
+    # registers are the numbers of the registers it names, in the order written; immediate is
+    # the immediate value, the branch target for a branch, or None. The assembly text and the
+    # operand texts are rendered from these when asked for.
+    __slots__ = ("address", "word", "mnemonic", "registers", "immediate")
+
+    # opcode -> instruction format (see isa.py), None for the unassigned ones
+    instruction_formats = tuple(None if entry is None else entry[1] for entry in isa.decode_table)
+
+    def __init__(self, address, word, mnemonic, registers, immediate):
+        self.address = address
+        self.word = word
+        self.mnemonic = mnemonic
+        self.registers = registers
+        self.immediate = immediate
+
+    def __repr__(self):
+        return f"Instruction(0x{self.address:X}, 0x{self.word:08X}, {self.text()!r})"
+
+    def __str__(self):
+        return self.text()
+
+    @property
+    def operands(self):
+        fmt = self.instruction_formats[self.word >> 27]
+        if fmt == "branch":
+            return (f"0x{self.immediate:X}",)
+        registers = [f"r{number}" for number in self.registers]
+        if fmt == "mem":
+            return registers[0], f"{self.immediate}[{registers[1]}]"
+        if self.immediate is not None:
+            registers.append(str(self.immediate))
+        return tuple(registers)
+
+    def text(self):
+        if self.mnemonic is None:
+            return "UNKNOWN"
+        operands = self.operands
+        return f"{self.mnemonic} {', '.join(operands)}" if operands else self.mnemonic
+
+    def binary(self):
+        return f"{self.word:032b}  # {self.text()}"
+
+    def jsonl(self):
+        # operand texts never need escaping
+        mnemonic = "null" if self.mnemonic is None else f'"{self.mnemonic}"'
+        operands = ", ".join(f'"{operand}"' for operand in self.operands)
+        immediate = "null" if self.immediate is None else self.immediate
+        return (f'{{"address": {self.address}, "word": {self.word}, "mnemonic": {mnemonic}, '
+                f'"operands": [{operands}], "immediate": {immediate}}}')
+
+    def csv(self):
+        immediate = "" if self.immediate is None else self.immediate
+        return f'0x{self.address:X},{self.word:032b},{self.mnemonic or "UNKNOWN"},"{", ".join(self.operands)}",{immediate}'
+
+    # listing format -> (header line or None, renderer)
+    formats = {
+        "plain": (None, text), "binary": (None, binary), "jsonl": (None, jsonl),
+        "csv": ("address,word,mnemonic,operands,immediate", csv),
     }
+
+
+class Disassembler:
+    # instruction set tables, see isa.py
+    opcode_names = isa.opcode_names
+    branch_opcodes = isa.branch_opcodes
+
+    # below this many words the NumPy setup costs more than it saves
+    numpy_threshold = 1024
+    # words decoded per block in decode_words
+    block_size = 65536
+    # deletes the binary digits from a string (see text_words)
+    binary_digits = str.maketrans("", "", "01")
     
-    def __init__(self, filename):
+    def __init__(self, filename, base_address=0x0000, source=None, stats=None, cache_size=65536):
+        # source, when given, is the input itself (text, or bytes for binary mode) and filename
+        # only names it in messages; stats, a stats.Stats, collects timings and counters
         self.filename = filename
+        self.source = source
+        self.stats = stats
+        self.base_address = base_address
         self.instructions = []
+        # raw word -> (mnemonic, registers, immediate, text), see decode_templates; emptied
+        # when it would grow past cache_size
+        self.decode_cache = {}
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
     
-    def bin_to_int(self, binary, signed=False):
-        value = int(binary, 2)
-        if signed and binary[0] == "1":  # Handle sign extension for negative numbers
-            value -= 2 ** len(binary)
-        return value
-    
-    def reg_from_bin(self, bin_val):
-        return f"r{int(bin_val, 2)}"
-    
-    def disassemble(self):
+    # Decoded fields of a block of words, one tuple per word:
+    # (opcode, imm flag, rd, rs1, mod, rs2, unsigned imm16, signed imm16, branch offset in words)
+    def decode_fields(self, words):
+        if np is not None and len(words) >= self.numpy_threshold:
+            w = np.frombuffer(words, dtype=np.uint32) if isinstance(words, array) else np.asarray(words, dtype=np.uint32)
+            uimm = (w & 0xFFFF).astype(np.int64)
+            offset = (w & 0x7FFFFFF).astype(np.int64)
+            offset -= (offset & 0x4000000) << 1
+            columns = (w >> 27, (w >> 26) & 1, (w >> 22) & 0xF, (w >> 18) & 0xF, (w >> 16) & 0x3, (w >> 14) & 0xF,
+                       uimm, uimm - ((uimm & 0x8000) << 1), offset)
+            return zip(*[column.tolist() for column in columns])
+
+        return ((word >> 27, (word >> 26) & 1, (word >> 22) & 0xF, (word >> 18) & 0xF, (word >> 16) & 0x3, (word >> 14) & 0xF,
+                 word & 0xFFFF, (word & 0xFFFF) - ((word & 0x8000) << 1), (word & 0x7FFFFFF) - ((word & 0x4000000) << 1))
+                for word in words)
+
+    def decode_templates(self, words):
+        # (mnemonic, registers, immediate, assembly text) of each word, which depend on the word
+        # alone; that is what lets block_templates cache them. One lookup in isa.decoders per
+        # word picks the decoder of its instruction.
+        decoders = isa.decoders
+        templates = []
+        append = templates.append
+        for op, imm_flag, rd, rs1, mod, rs2, uimm, simm, offset in self.decode_fields(words):
+            append(decoders[op](imm_flag, rd, rs1, mod, rs2, uimm, simm, offset))
+        return templates
+
+    def block_templates(self, words):
+        # Templates of a block of words. Each distinct word is decoded once, or taken from the
+        # decode cache. A block of mostly distinct words is decoded directly instead, since a
+        # table would not pay for itself.
+        unique = set(words)
+        if len(unique) * 2 > len(words):
+            self.cache_misses += len(words)
+            return self.decode_templates(words)
+
+        cache = self.decode_cache
+        table = {}
+        missing = []
+        for word in unique:
+            template = cache.get(word)
+            if template is None:
+                missing.append(word)
+            else:
+                table[word] = template
+        decoded = dict(zip(missing, self.decode_templates(array("I", missing))))
+        table.update(decoded)
+
+        self.cache_misses += len(missing)
+        self.cache_hits += len(words) - len(missing)
+        if self.cache_size > 0:
+            if len(cache) + len(decoded) > self.cache_size:
+                cache.clear()
+            cache.update(islice(decoded.items(), self.cache_size))
+        return map(table.__getitem__, words)
+
+    def decode_block(self, words, address):
+        # Instruction records of a block; only branch targets are computed per address.
+        branches = self.branch_opcodes
+        records = []
+        append = records.append
+        for word, (mnemonic, registers, immediate, _) in zip(words, self.block_templates(words)):
+            if word >> 27 in branches:
+                immediate = address + 4 * immediate
+            append(Instruction(address, word, mnemonic, registers, immediate))
+            address += 4
+        return records
+
+    def block_lines(self, words, address, include_binary=False):
+        # Plain (or with include_binary, binary) listing lines of a block, straight from the
+        # templates: the lines render() gives for decode_block's records, without the records.
+        branches = self.branch_opcodes
+        texts = []
+        append = texts.append
+        for word, (_, _, immediate, text) in zip(words, self.block_templates(words)):
+            if word >> 27 in branches:
+                append(f"{text}0x{address + 4 * immediate:X}")
+            else:
+                append(text)
+            address += 4
+        if not include_binary:
+            return texts
+        return [f"{bits}  # {text}" for bits, text in zip(self.word_bits(words), texts)]
+
+    def word_bits(self, words):
+        # The 32-character binary text of each word, for a whole block from one int-to-binary
+        # conversion instead of formatting each word
+        words = array("I", words)
+        if sys.byteorder == "little":
+            words.byteswap()
+        bits = format(int.from_bytes(words.tobytes(), "big"), f"0{32 * len(words)}b")
+        return [bits[offset:offset + 32] for offset in range(0, len(bits), 32)]
+
+    def decode_words(self, words, address=0x0000):
+        decoded = []
+        for start in range(0, len(words), self.block_size):
+            decoded.extend(self.decode_block(words[start:start + self.block_size], address + 4 * start))
+        return decoded
+
+    def words_from_bytes(self, data):
+        # Packed big-endian words (the assemble.py -b layout) into a native word array.
+        if len(data) % 4:
+            print(f"Warning: ignoring {len(data) % 4} trailing byte(s) in '{self.filename}'", file=sys.stderr)
+        words = array("I")
+        with memoryview(data) as view, view[:len(data) - len(data) % 4] as body:
+            words.frombytes(body)
+        if sys.byteorder == "little":
+            words.byteswap()
+        return words
+
+    def read_bin(self):
+        # The file is memory-mapped and its words copied straight out of the mapping.
+        if self.source is not None:
+            return self.words_from_bytes(self.source)
+        with open(self.filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return array("I")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return self.words_from_bytes(mapped)
+
+    def text_words(self, lines):
+        # Words of text dump lines: every line of 32 binary digits, other lines are skipped.
+        # The digits of all lines are checked in one pass; only a chunk with other characters
+        # is filtered line by line.
+        lines = [line for line in map(str.strip, lines) if len(line) == 32]
+        if "".join(lines).translate(self.binary_digits):
+            lines = [line for line in lines if not line.strip("01")]
+        return array("I", [int(line, 2) for line in lines])
+
+    def read_text(self):
+        with (io.StringIO(self.source) if self.source is not None else open(self.filename, "r")) as f:
+            return self.text_words(f)
+
+    def read_chunks(self, binary=False, chunk_size=1 << 18):
+        # Word arrays of the input as it arrives, each from about chunk_size bytes; the filename
+        # "-" reads stdin. Bytes of a .bin word split across two reads wait for the next one.
+        if self.source is not None:
+            yield self.words_from_bytes(self.source) if binary else self.read_text()
+            return
+        if not binary:
+            with nullcontext(sys.stdin) if self.filename == "-" else open(self.filename, "r") as f:
+                while True:
+                    lines = f.readlines(chunk_size)
+                    if not lines:
+                        return
+                    yield self.text_words(lines)
+        with nullcontext(sys.stdin.buffer) if self.filename == "-" else open(self.filename, "rb") as f:
+            pending = b""
+            while True:
+                data = f.read1(chunk_size)
+                if not data:
+                    break
+                data = pending + data
+                usable = len(data) - len(data) % 4
+                pending = data[usable:]
+                yield self.words_from_bytes(data[:usable])
+        if pending:
+            print(f"Warning: ignoring {len(pending)} trailing byte(s) in '{self.filename}'", file=sys.stderr)
+
+    def view(self, binary=False):
+        # A DisassemblyView of the input. A .bin file stays memory-mapped and only the words
+        # asked for are read; a text dump is parsed in full, but decoded lazily all the same.
+        if not binary:
+            return DisassemblyView(self, self.read_text())
+        if self.source is not None:
+            return DisassemblyView(self, self.source)
+        f = open(self.filename, "rb")
+        if os.fstat(f.fileno()).st_size == 0:
+            f.close()
+            return DisassemblyView(self, b"")
+        return DisassemblyView(self, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), f)
+
+    @timed("disassemble")
+    def disassemble(self, binary=False):
         try:
-            with open(self.filename, "r") as f:
-                address = 0x0000
-                for line in f:
-                    binary_instr = line.strip()
-                    if len(binary_instr) != 32:
-                        continue  # Skip invalid lines
-                    
-                    opcode = binary_instr[:5]
-                    imm_flag = binary_instr[5]
-                    rd = binary_instr[6:10]
-                    rs1 = binary_instr[10:14]
-                    mod = binary_instr[14:16]
-                    imm_or_rs2 = binary_instr[16:]
-                    
-                    if opcode in self.opcodes:
-                        mnemonic = self.opcodes[opcode]
-                        
-                        if mnemonic in ["nop", "ret", "hlt"]:
-                            self.instructions.append(f"{binary_instr}  # {mnemonic}")
-                        elif mnemonic in ["b", "beq", "bgt", "call"]:
-                            offset = self.bin_to_int(binary_instr[5:], signed=True)
-                            self.instructions.append(f"{binary_instr}  # {mnemonic} 0x{format(address + offset, 'X')}")
-                        elif mnemonic in ["not", "mov"]:
-                            if imm_flag == "1":
-                                imm = self.bin_to_int(imm_or_rs2, signed=True)
-                                self.instructions.append(f"{binary_instr}  # {mnemonic} {self.reg_from_bin(rd)}, {imm}")
-                            else:
-                                self.instructions.append(f"{binary_instr}  # {mnemonic} {self.reg_from_bin(rd)}, {self.reg_from_bin(binary_instr[14:18])}")
-                        elif mnemonic == "cmp":
-                            if imm_flag == "1":
-                                imm = self.bin_to_int(imm_or_rs2, signed=True)
-                                self.instructions.append(f"{binary_instr}  # {mnemonic} {self.reg_from_bin(rs1)}, {imm}")
-                            else:
-                                self.instructions.append(f"{binary_instr}  # {mnemonic} {self.reg_from_bin(rs1)}, {self.reg_from_bin(rs1)}")
-                        elif mnemonic in ["add", "sub", "mul", "div", "mod", "and", "or", "lsl", "lsr", "asr"]:
-                            if imm_flag == "1":
-                                imm = self.bin_to_int(imm_or_rs2, signed=(mod != "00"))
-                                modifier = "u" if mod == "01" else "h" if mod == "10" else ""
-                                self.instructions.append(f"{binary_instr}  # {mnemonic}{modifier} {self.reg_from_bin(rd)}, {self.reg_from_bin(rs1)}, {imm}")
-                            else:
-                                self.instructions.append(f"{binary_instr}  # {mnemonic} {self.reg_from_bin(rd)}, {self.reg_from_bin(rs1)}, {self.reg_from_bin(imm_or_rs2[:4])}")
-                        elif mnemonic in ["ld", "st"]:
-                            imm = self.bin_to_int(imm_or_rs2, signed=True)
-                            self.instructions.append(f"{binary_instr}  # {mnemonic} {self.reg_from_bin(rd)}, {imm}[{self.reg_from_bin(rs1)}]")
-                    else:
-                        self.instructions.append(f"{binary_instr}  # UNKNOWN")
-                    
-                    address += 4
+            words = self.read_bin() if binary else self.read_text()
         except FileNotFoundError:
-            print(f"Error: File '{self.filename}' not found.")
+            print(f"Error: File '{self.filename}' not found.", file=sys.stderr)
             return
+        hits, misses = self.cache_hits, self.cache_misses
+        self.instructions.extend(self.decode_words(words, self.base_address))
+        if self.stats is not None:
+            self.stats.count("instructions", len(words))
+            self.stats.count("decode_cache_hits", self.cache_hits - hits)
+            self.stats.count("decode_cache_misses", self.cache_misses - misses)
+            self.stats.count_opcodes(words, self.opcode_names)
     
-    def save_to_file(self, output_file, include_binary):
+    @timed("disassemble")
+    def stream(self, output, include_binary, binary=False, selection=None, fmt=None):
+        # Decodes the input chunk by chunk as it arrives and writes each chunk's lines to output
+        # (a text file) straight away, so memory stays bounded whatever the input size.
+        # selection is an address slice as for --range; reading stops past its end. fmt is a
+        # listing format as for render(). Returns the number of words written.
+        hits, misses = self.cache_hits, self.cache_misses
+        address = self.base_address
+        written = 0
+        for words in self.read_chunks(binary):
+            first, address = address, address + 4 * len(words)
+            low, high = 0, len(words)
+            if selection is not None:
+                if selection.start is not None:
+                    low = min(max(-(-(selection.start - first) // 4), 0), high)
+                if selection.stop is not None:
+                    high = min(max(-(-(selection.stop - first) // 4), 0), high)
+            if low < high:
+                if fmt in (None, "plain", "binary"):
+                    lines = self.block_lines(words[low:high], first + 4 * low, include_binary or fmt == "binary")
+                else:
+                    lines = self.render(include_binary, self.decode_block(words[low:high], first + 4 * low), fmt, header=not written)
+                text = "".join(line + "\n" for line in lines)
+                output.write(text)
+                written += high - low
+                if self.stats is not None:
+                    self.stats.bytes_written["listing"] += len(text)
+                    self.stats.count_opcodes(words[low:high], self.opcode_names)
+            if selection is not None and selection.stop is not None and address >= selection.stop:
+                break
+        if self.stats is not None:
+            self.stats.count("instructions", written)
+            self.stats.count("decode_cache_hits", self.cache_hits - hits)
+            self.stats.count("decode_cache_misses", self.cache_misses - misses)
+        return written
+
+    def render(self, include_binary=False, lines=None, fmt=None, header=True):
+        # Listing lines of the records (self.instructions unless lines is given) in one pass.
+        # fmt is one of Instruction.formats (plain, binary, jsonl, csv); without it
+        # include_binary picks binary or plain. header=False leaves out the csv header.
+        fmt = fmt or ("binary" if include_binary else "plain")
+        heading, line = Instruction.formats[fmt]
+        records = self.instructions if lines is None else lines
+        if heading is not None and header:
+            yield heading
+        if fmt == "binary":
+            yield from self.binary_lines(records)
+        else:
+            yield from map(line, records)
+
+    def binary_lines(self, records):
+        # Instruction.binary() of every record, the bits taken from word_bits a block at a time
+        records = records if isinstance(records, list) else list(records)
+        for start in range(0, len(records), self.block_size):
+            block = records[start:start + self.block_size]
+            for bits, record in zip(self.word_bits([record.word for record in block]), block):
+                yield f"{bits}  # {record.text()}"
+
+    @timed("write")
+    def save_to_file(self, output_file, include_binary, lines=None, fmt=None):
+        # lines, e.g. a slice of a view, replaces self.instructions; output_file "-" is stdout
+        if output_file == "-":
+            sys.stdout.writelines(line + "\n" for line in self.render(include_binary, lines, fmt))
+            return
         with open(output_file, "w") as f:
-            for instr in self.instructions:
-                disassembled_part = instr.split("#")[-1].strip()
-                f.write((instr if include_binary else disassembled_part) + "\n")
+            f.writelines(line + "\n" for line in self.render(include_binary, lines, fmt))
+        if self.stats is not None:
+            self.stats.bytes_written["listing"] += os.path.getsize(output_file)
         print(f"Disassembled binary saved to {output_file}")
 
-def main():
-    parser = argparse.ArgumentParser(description="SimpleRisc Disassembler")
-    parser.add_argument("-f", "--file", required=True, help="Input text file with binary instructions")
-    parser.add_argument("-o", "--output", required=True, help="Output text file to save disassembled binary")
-    parser.add_argument("-i", "--include-binary", action="store_true", help="Include binary instructions in output")
-    
-    args = parser.parse_args()
-    disassembler = Disassembler(args.file)
-    disassembler.disassemble()
-    disassembler.save_to_file(args.output, args.include_binary)
+class DisassemblyView:
+    # Random-access listing of an image, decoded on demand: view[address] is the Instruction
+    # at that address and view[start:end] the ones from start up to (not including) end,
+    # like a list slice but in addresses. Only the words asked for are decoded, through the
+    # disassembler's decode cache. source is either a word array or packed .bin bytes.
+    def __init__(self, disassembler, source, file=None):
+        self.disassembler = disassembler
+        self.source = source
+        self.file = file
+        self.base_address = disassembler.base_address
+        if isinstance(source, array):
+            self.count = len(source)
+        else:
+            self.count = len(source) // 4
+            if len(source) % 4:
+                print(f"Warning: ignoring {len(source) % 4} trailing byte(s) in '{disassembler.filename}'", file=sys.stderr)
 
-if __name__ == "__main__":
-    main()
+    def __len__(self):
+        return self.count
 
-def runDisassembler(self):
-    disassemble_path = "unassemble.py"
+    def words(self, start, stop):
+        # Words start..stop-1 (indexes, not addresses)
+        if isinstance(self.source, array):
+            return self.source[start:stop]
+        return self.disassembler.words_from_bytes(self.source[start * 4:stop * 4])
 
-    # Write input binary to a file
-    with open("binary.txt", "w") as f:
-        f.write(self.unasm_text_edit.toPlainText())
+    def lines(self, start, stop):
+        return self.disassembler.decode_words(self.words(start, stop), self.base_address + 4 * start)
 
-    output_file = "disassembled_output.txt"
-    option_map = {"Include Binary (-i)": "-i", "Default Output": ""}
-    selected_option = option_map[self.unasm_option_box.currentText()]
+    def index(self, address):
+        if (address - self.base_address) % 4:
+            raise IndexError(f"address 0x{address:X} is not word-aligned")
+        return (address - self.base_address) // 4
 
-    command = ["python", disassemble_path, "-f", "binary.txt", "-o", output_file]
-    if selected_option:
-        command.append(selected_option)
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step not in (None, 4):
+                raise ValueError("a view can only be sliced with step 4 (one word)")
+            start = 0 if key.start is None else -(-(key.start - self.base_address) // 4)
+            stop = self.count if key.stop is None else -(-(key.stop - self.base_address) // 4)
+            start, stop = min(max(start, 0), self.count), min(max(stop, 0), self.count)
+            return self.lines(start, stop) if start < stop else []
+        index = self.index(key)
+        if not 0 <= index < self.count:
+            raise IndexError(f"address 0x{key:X} is outside the image")
+        return self.lines(index, index + 1)[0]
 
-    try:
-        result = subprocess.run(command, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            output_text = f"Error: {result.stderr}"
-        else:
-            # Read output from the disassembled file
-            try:
-                with open(output_file, "r") as f:
-                    output_text = f.read()
-            except FileNotFoundError:
-                output_text = "Error: disassembled_output.txt not found."
+    def __iter__(self):
+        block_size = self.disassembler.block_size
+        for start in range(0, self.count, block_size):
+            yield from self.lines(start, min(start + block_size, self.count))
+
+    def close(self):
+        if self.file is not None:
+            self.source.close()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
-    except Exception as e:
-        output_text = f"Exception: {str(e)}"
 
-    self.unasm_output_text.setText(output_text)
\ No newline at end of file
+def address_range(text):
+    # "--range start:end" -> slice; either end may be left out
+    start, _, stop = text.partition(":")
+    return slice(int(start, 0) if start else None, int(stop, 0) if stop else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleRisc Disassembler")
+    parser.add_argument("-f", "--file", required=True, help="Input text file with binary instructions, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Output text file to save disassembled binary (default: -, stdout)")
+    parser.add_argument("-i", "--include-binary", action="store_true", help="Include binary instructions in output (same as -F binary)")
+    parser.add_argument("-F", "--format", choices=list(Instruction.formats), help="Listing format: plain (default), binary, jsonl or csv")
+    parser.add_argument("-b", "--bin", action="store_true", help="Input is a raw big-endian .bin image (as written by assemble.py -b)")
+    parser.add_argument("-a", "--base", type=lambda value: int(value, 0), default=0x0000, help="Address of the first word, e.g. 0x1000 to match .org 0x1000")
+    parser.add_argument("-c", "--cache-size", type=int, default=65536, help="Distinct instruction words kept in the decode cache (0 disables it)")
+    parser.add_argument("-r", "--range", type=address_range, help="Only disassemble addresses start:end (end excluded), e.g. 0xC000:0xC100")
+    parser.add_argument("--stats", action="store_true", help="Print per-phase timings, counters and peak memory to stderr")
+    
+    args = parser.parse_args()
+    disassembler = Disassembler(args.file, args.base, stats=Stats() if args.stats else None, cache_size=args.cache_size)
+    if args.range is not None and args.file != "-":
+        try:
+            with disassembler.view(binary=args.bin) as view:
+                disassembler.save_to_file(args.output, args.include_binary, view[args.range], args.format)
+        except FileNotFoundError:
+            print(f"Error: File '{args.file}' not found.", file=sys.stderr)
+            sys.exit(1)
+    else:
+        # decoded and written block by block as the input is read, in any format
+        try:
+            with nullcontext(sys.stdout) if args.output == "-" else open(args.output, "w") as output:
+                disassembler.stream(output, args.include_binary, args.bin, args.range, args.format)
+        except FileNotFoundError:
+            print(f"Error: File '{args.file}' not found.", file=sys.stderr)
+            sys.exit(1)
+        if args.output != "-":
+            print(f"Disassembled binary saved to {args.output}")
+    if disassembler.stats is not None:
+        disassembler.stats.report(sys.stderr)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file